@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from foodgram.settings import (TOKEN_CACHE_LOCAL_SIZE, TOKEN_CACHE_LOCAL_TTL,
+                               TOKEN_CACHE_TTL)
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+SNAPSHOT_FIELDS = (
+    'id', 'email', 'username', 'first_name', 'last_name',
+    'is_active', 'is_staff', 'is_superuser',
+)
+CACHE_KEY = 'auth:token:{}'
+GENERATION_KEY = 'auth:token:generation:{}'
+
+
+class LRUCache:
+    """Небольшой LRU-кеш процесса с временем жизни записей."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class TokenCache:
+    """
+    Кеш «токен -> снимок пользователя»: LRU процесса поверх кеша Django.
+    Кеш Django общий для процессов, а локальная запись живёт
+    TOKEN_CACHE_LOCAL_TTL секунд, поэтому сброс в другом процессе
+    виден здесь не позже этого срока.
+    Запись хранит поколение токена, прочитанное до запроса к базе.
+    delete() меняет поколение, и запись, сохранённая запоздавшим
+    запросом после выхода пользователя, уже не принимается.
+    """
+    field_names = tuple(
+        field.attname for field in User._meta.concrete_fields
+        if field.attname in SNAPSHOT_FIELDS
+    )
+
+    def __init__(self):
+        self.local = LRUCache(TOKEN_CACHE_LOCAL_SIZE, TOKEN_CACHE_LOCAL_TTL)
+
+    def generation(self, key):
+        """Текущее поколение токена; читается до запроса к базе."""
+        generation_key = GENERATION_KEY.format(key)
+        cache.add(generation_key, time.time_ns(), None)
+        return cache.get(generation_key)
+
+    def get(self, key):
+        values = self.local.get(key)
+        if values is None:
+            cached = cache.get_many(
+                (CACHE_KEY.format(key), GENERATION_KEY.format(key))
+            )
+            entry = cached.get(CACHE_KEY.format(key))
+            if entry is None:
+                return None
+            generation, values = entry
+            if generation != cached.get(GENERATION_KEY.format(key)):
+                return None
+            self.local.set(key, values)
+        return User.from_db(DEFAULT_DB_ALIAS, self.field_names, values)
+
+    def set(self, key, user, generation):
+        if generation is None:
+            return
+        values = tuple(getattr(user, name) for name in self.field_names)
+        cache.set(CACHE_KEY.format(key), (generation, values),
+                  TOKEN_CACHE_TTL)
+
+    def delete(self, key):
+        self.local.delete(key)
+        cache.set(GENERATION_KEY.format(key), time.time_ns(), None)
+        cache.delete(CACHE_KEY.format(key))
+
+    def delete_on_commit(self, key):
+        """
+        Сбрасывает запись сразу и ещё раз после коммита: запрос,
+        прочитавший базу до коммита, мог снова сохранить её.
+        """
+        self.delete(key)
+        transaction.on_commit(lambda: self.delete(key))
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену без запроса к базе при тёплом кеше.
+    Пользователь собирается из снимка; остальные поля отложены
+    и подгружаются из базы только при обращении к ним.
+    """
+
+    def authenticate_credentials(self, key):
+        user = token_cache.get(key)
+        if user is not None:
+            return user, Token(key=key, user=user)
+        generation = token_cache.generation(key)
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, generation)
+        return user, token
@@ -0,0 +1,80 @@
+import gzip
+import re
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+from foodgram.settings import CATALOG_SNAPSHOT_TTL
+from recipes.models import CatalogSequence, CatalogTombstone
+from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from api.serializers import CatalogSyncSerializer
+
+SNAPSHOT_KEY = 'catalog:snapshot:{model}:{seq}'
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+
+class CatalogSyncMixin:
+    """
+    Синхронизация справочника по номерам изменений.
+    ?since=<seq> отдаёт записи, изменённые после seq, и id удалённых;
+    snapshot/ - весь справочник в том же формате, сжатый gzip.
+    """
+
+    def get_model_name(self):
+        return self.get_queryset().model._meta.model_name
+
+    def get_changes(self, seq, since):
+        changed = self.get_queryset().filter(seq__gt=since)
+        deleted = CatalogTombstone.objects.filter(
+            model=self.get_model_name(), seq__gt=since
+        ).values_list('object_id', flat=True)
+        return {
+            'seq': seq,
+            'changed': self.get_serializer(changed, many=True).data,
+            'deleted': list(deleted),
+        }
+
+    def list(self, request, *args, **kwargs):
+        if 'since' not in request.query_params:
+            return super().list(request, *args, **kwargs)
+        params = CatalogSyncSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return Response(self.get_changes(
+            CatalogSequence.objects.current(),
+            params.validated_data['since'],
+        ))
+
+    def get_snapshot(self, seq):
+        """Сжатый справочник; собирается заново только при новом seq."""
+        key = SNAPSHOT_KEY.format(model=self.get_model_name(), seq=seq)
+        snapshot = cache.get(key)
+        if snapshot is None:
+            snapshot = gzip.compress(
+                JSONRenderer().render(self.get_changes(seq, 0))
+            )
+            cache.set(key, snapshot, CATALOG_SNAPSHOT_TTL)
+        return snapshot
+
+    @action(detail=False, methods=('get',), pagination_class=None)
+    def snapshot(self, request):
+        seq = CatalogSequence.objects.current()
+        etag = f'"{self.get_model_name()}-{seq}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            snapshot = self.get_snapshot(seq)
+            accept_encoding = request.headers.get('Accept-Encoding', '')
+            if ACCEPTS_GZIP.search(accept_encoding):
+                response = HttpResponse(snapshot,
+                                        content_type='application/json')
+                response['Content-Encoding'] = 'gzip'
+            else:
+                response = HttpResponse(gzip.decompress(snapshot),
+                                        content_type='application/json')
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, no_cache=True)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
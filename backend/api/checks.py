@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches)
+def check_shared_default_cache(app_configs, **kwargs):
+    """
+    Версии данных для ETag и кеша ответов, а также токены хранятся
+    в кеше по умолчанию: он должен быть общим для всех процессов.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.DEBUG or backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Error(
+        f'Кеш по умолчанию {backend} виден только своему процессу.',
+        hint='Укажите общий кеш в CACHE_BACKEND, например '
+             'FileBasedCache или DatabaseCache.',
+        id='api.E001',
+    )]
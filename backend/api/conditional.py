@@ -0,0 +1,65 @@
+import hashlib
+
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+from recipes import versions
+
+
+class ConditionalGetMixin:
+    """
+    ETag для list и retrieve по версиям данных
+    (get_etag_data, по умолчанию - счётчики из кеша).
+    Совпавший If-None-Match получает 304 до запросов к базе
+    и сериализации.
+    """
+    etag_versions = ()
+    # Ответ зависит от пользователя (is_favorited и т.п.).
+    etag_per_user = False
+
+    def get_etag_versions(self, request):
+        names = list(self.etag_versions)
+        if self.etag_per_user and request.user.is_authenticated:
+            names.append(versions.user_version(request.user.pk))
+        return names
+
+    def get_etag_data(self, request):
+        """Версии данных ответа; кеш по умолчанию общий для процессов."""
+        return sorted(versions.get_versions(
+            self.get_etag_versions(request)
+        ).items())
+
+    def get_etag(self, request):
+        user = request.user
+        parts = (
+            type(self).__name__,
+            self.action,
+            sorted(self.kwargs.items()),
+            sorted(request.query_params.lists()),
+            request.accepted_renderer.format,
+            user.pk if self.etag_per_user else None,
+            self.get_etag_data(request),
+        )
+        digest = hashlib.md5(repr(parts).encode())
+        return f'"{digest.hexdigest()}"'
+
+    def dispatch_conditional(self, request, handler, *args, **kwargs):
+        etag = self.get_etag(request)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            patch_cache_control(response, no_cache=True)
+            if self.etag_per_user:
+                patch_vary_headers(response, ('Authorization',))
+                if request.user.is_authenticated:
+                    patch_cache_control(response, private=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.dispatch_conditional(request, super().list,
+                                         *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.dispatch_conditional(request, super().retrieve,
+                                         *args, **kwargs)
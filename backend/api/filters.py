@@ -1,57 +1,121 @@
-import django_filters as filters
-from recipes.models import Ingredient, Recipe
-from users.models import User
-from rest_framework.filters import SearchFilter
-
-
-class IngredientFilter(SearchFilter):
-    """Фильтрация ингридиентов."""
-
-    name = filters.CharFilter(lookup_expr='istartswith')
-
-    class Meta:
-        model = Ingredient
-        fields = ('name',)
-
-
-RECIPE_CHOICES = (
-    (0, 'Not_In_List'),
-    (1, 'In_List'),
-)
-
-
-class RecipeFilter(filters.FilterSet):
-    """Фильтрация рецептов."""
-
-    author = filters.ModelChoiceFilter(
-        queryset=User.objects.all()
-    )
-    is_in_shopping_cart = filters.ChoiceFilter(
-        choices=RECIPE_CHOICES,
-        method='get_is_in'
-    )
-    is_favorited = filters.ChoiceFilter(
-        choices=RECIPE_CHOICES,
-        method='get_is_in'
-    )
-    tags = filters.AllValuesMultipleFilter(
-        field_name='tags__slug',
-        label='Ссылка'
-    )
-
-    def get_is_in(self, queryset, name, value):
-        """
-        Фильтрация рецептов по избранному и списку покупок.
-        """
-        user = self.request.user
-        if user.is_authenticated:
-            if value == '1':
-                if name == 'is_favorited':
-                    queryset = queryset.filter(favorite_recipes__user=user)
-                if name == 'is_in_shopping_cart':
-                    queryset = queryset.filter(shopping_cart__user=user)
-        return queryset
-
-    class Meta:
-        model = Recipe
-        fields = ('is_favorited', 'is_in_shopping_cart', 'author', 'tags')
+import django_filters as filters
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from foodgram.settings import RECIPE_SEARCH_CONFIG
+from recipes.ingredient_index import ingredient_index
+from recipes.models import Recipe
+from recipes.tag_bits import tag_bits
+from users.models import User
+from rest_framework.filters import SearchFilter
+
+
+class IngredientFilter(SearchFilter):
+    """
+    Фильтрация ингридиентов по началу названия.
+    Поиск идёт по индексу в памяти, без запроса к базе.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        prefix = request.query_params.get(self.search_param, '').strip()
+        if not prefix or view.action != 'list':
+            return queryset
+        return ingredient_index.search(prefix)
+
+
+RECIPE_CHOICES = (
+    (0, 'Not_In_List'),
+    (1, 'In_List'),
+)
+ORDERING_CHOICES = (
+    ('popular', 'Популярные'),
+)
+
+
+def tag_choices():
+    return tag_bits.choices()
+
+
+class RecipeFilter(filters.FilterSet):
+    """Фильтрация рецептов."""
+
+    author = filters.ModelChoiceFilter(
+        queryset=User.objects.all()
+    )
+    is_in_shopping_cart = filters.ChoiceFilter(
+        choices=RECIPE_CHOICES,
+        method='get_is_in'
+    )
+    is_favorited = filters.ChoiceFilter(
+        choices=RECIPE_CHOICES,
+        method='get_is_in'
+    )
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices,
+        method='get_tags',
+        label='Ссылка'
+    )
+    search = filters.CharFilter(
+        method='get_search',
+        label='Поиск'
+    )
+    ordering = filters.ChoiceFilter(
+        choices=ORDERING_CHOICES,
+        method='get_ordering'
+    )
+
+    def get_is_in(self, queryset, name, value):
+        """
+        Фильтрация рецептов по избранному и списку покупок.
+        """
+        user = self.request.user
+        if user.is_authenticated:
+            if value == '1':
+                if name == 'is_favorited':
+                    queryset = queryset.filter(favorite_recipes__user=user)
+                if name == 'is_in_shopping_cart':
+                    queryset = queryset.filter(shopping_cart__user=user)
+        return queryset
+
+    def get_tags(self, queryset, name, value):
+        """Рецепты с любым из тегов: одна проверка маски, без JOIN."""
+        if not value:
+            return queryset
+        return queryset.alias(
+            tag_match=F('tags_mask').bitand(tag_bits.mask(value))
+        ).filter(tag_match__gt=0)
+
+    def get_search(self, queryset, name, value):
+        """
+        Полнотекстовый поиск по названию и описанию с ранжированием.
+        Совпадения в названии весят больше, чем в описании.
+        """
+        value = value.strip()
+        if not value:
+            return queryset
+        if connections[queryset.db].vendor == 'postgresql':
+            query = SearchQuery(value, config=RECIPE_SEARCH_CONFIG,
+                                search_type='websearch')
+            queryset = queryset.filter(search_vector=query).annotate(
+                rank=SearchRank(F('search_vector'), query)
+            )
+        else:
+            queryset = queryset.filter(
+                Q(name__icontains=value) | Q(text__icontains=value)
+            ).annotate(rank=Case(
+                When(name__icontains=value, then=Value(2)),
+                default=Value(1),
+                output_field=IntegerField(),
+            ))
+        return queryset.order_by('-rank', '-pub_date', '-id')
+
+    def get_ordering(self, queryset, name, value):
+        """Сортировка по популярности: избранное, затем корзины."""
+        if value == 'popular':
+            return queryset.order_by(*Recipe.POPULAR_ORDERING)
+        return queryset
+
+    class Meta:
+        model = Recipe
+        fields = ('is_favorited', 'is_in_shopping_cart', 'author', 'tags',
+                  'search', 'ordering')
@@ -0,0 +1,28 @@
+from api import response_cache, views  # noqa: F401
+from django.core.management.base import BaseCommand
+
+MSG_ROW = '{endpoint}: {hits} hits, {misses} misses, hit rate {rate:.0%}'
+
+
+class Command(BaseCommand):
+    help = ("This command prints hit and miss counters "
+            "of the anonymous response cache")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='reset counters after printing.')
+
+    def handle(self, *args, **options):
+        for view_name, actions in sorted(response_cache.endpoints.items()):
+            for action in actions:
+                endpoint = f'{view_name}.{action}'
+                stats = response_cache.get_stats(endpoint)
+                total = stats[response_cache.HIT] + stats[response_cache.MISS]
+                self.stdout.write(MSG_ROW.format(
+                    endpoint=endpoint,
+                    hits=stats[response_cache.HIT],
+                    misses=stats[response_cache.MISS],
+                    rate=stats[response_cache.HIT] / total if total else 0,
+                ))
+                if options['reset']:
+                    response_cache.reset_stats(endpoint)
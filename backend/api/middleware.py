@@ -0,0 +1,146 @@
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+SQL_LISTS = re.compile(r'\(\s*(?:(?:%s|\?)\s*,\s*)+(?:%s|\?)\s*\)')
+
+
+class QueryBudgetExceeded(Exception):
+    """Представление выполнило больше запросов, чем ему разрешено."""
+
+
+def query_budget(limit):
+    """Сколько SQL-запросов разрешено действию вьюсета."""
+    def decorator(func):
+        func.query_budget = limit
+        return func
+    return decorator
+
+
+def get_action(request, view_func):
+    """Класс вьюсета и имя действия, которое обработает запрос."""
+    view_class = getattr(view_func, 'cls', None)
+    actions = getattr(view_func, 'actions', None)
+    if view_class is None or not actions:
+        return view_class, None
+    method = request.method.lower()
+    if method == 'head' and method not in actions:
+        method = 'get'
+    return view_class, actions.get(method)
+
+
+def get_query_budget(view_class, action):
+    """
+    Бюджет действия: @query_budget на методе
+    или query_budgets = {'list': 5} на вьюсете.
+    """
+    if view_class is None or action is None:
+        return None
+    budget = getattr(getattr(view_class, action, None), 'query_budget', None)
+    if budget is None:
+        budget = getattr(view_class, 'query_budgets', {}).get(action)
+    return budget
+
+
+def get_shape(sql):
+    """Запрос без значений: одинаковые формы выдают N+1."""
+    return SQL_LISTS.sub('(...)', SQL_LITERALS.sub('?', sql))
+
+
+class QueryRecorder:
+    """Обёртка execute_wrapper: число, время и формы запросов."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.shapes[get_shape(sql)] += 1
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.shapes.values() if count > 1)
+
+    def most_repeated(self):
+        for shape, count in self.shapes.most_common(1):
+            if count > 1:
+                return shape
+        return None
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Считает SQL-запросы каждого запроса и отдаёт их в заголовке
+    Server-Timing и в строке лога уровня DEBUG. Если у действия есть бюджет
+    и он превышен, при QUERY_BUDGET_ENFORCE выбрасывает
+    QueryBudgetExceeded, иначе пишет предупреждение.
+    Запросы потоковых ответов после возврата из представления
+    не учитываются.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SQL_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+        response['Server-Timing'] = (
+            f'db;dur={recorder.duration * 1000:.1f};'
+            f'desc="{recorder.count} queries, '
+            f'{recorder.duplicates} duplicates", '
+            f'total;dur={duration * 1000:.1f}'
+        )
+        budget = getattr(request, 'query_budget', None)
+        # Строка на каждый запрос - только при SQL_LOG_LEVEL=DEBUG.
+        logger.debug(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': getattr(request, 'view_name', None),
+            'status': response.status_code,
+            'queries': recorder.count,
+            'duplicates': recorder.duplicates,
+            'db_ms': round(recorder.duration * 1000, 1),
+            'total_ms': round(duration * 1000, 1),
+            'budget': budget,
+        }))
+        if budget is not None and recorder.count > budget:
+            self.budget_exceeded(request, recorder, budget)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class, action = get_action(request, view_func)
+        request.view_name = (f'{view_class.__name__}.{action}' if action
+                             else getattr(view_func, '__name__', None))
+        request.query_budget = get_query_budget(view_class, action)
+
+    def budget_exceeded(self, request, recorder, budget):
+        message = (f'{request.method} {request.path}: {recorder.count} '
+                   f'queries, budget {budget}. '
+                   f'Most repeated: {recorder.most_repeated()}')
+        if settings.QUERY_BUDGET_ENFORCE:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
@@ -1,7 +1,147 @@
-from rest_framework.pagination import PageNumberPagination
-
-
-class RecipePagination(PageNumberPagination):
-    """Пагинация рецептов."""
-    page_size = 6
-    page_size_query_param = 'limit'
+import base64
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """
+    Время с микросекундами: DjangoJSONEncoder округляет его
+    до миллисекунд, и записи внутри одной миллисекунды терялись бы.
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Пагинация по ключу: следующая страница начинается после
+    последней записи предыдущей, без OFFSET и без COUNT.
+    """
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def __init__(self, ordering, page_size):
+        self.ordering = ordering
+        self.page_size = page_size
+
+    def encode_cursor(self, instance):
+        values = [getattr(instance, field.lstrip('-'))
+                  for field in self.ordering]
+        data = json.dumps(values, cls=CursorEncoder)
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def get_position_filter(self, values):
+        """Условие «строго после курсора» для составного ключа."""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.count = None
+        if request.query_params.get(self.count_query_param):
+            self.count = queryset.count()
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            try:
+                queryset = queryset.filter(
+                    self.get_position_filter(self.decode_cursor(cursor))
+                )
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.last = page[-1] if page else None
+        return page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param,
+                                   self.encode_cursor(self.last))
+
+    def get_paginated_response(self, data):
+        response = {
+            'next': self.get_next_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            response = {'count': self.count, **response}
+        return Response(response)
+
+
+class RecipePagination(PageNumberPagination):
+    """
+    Пагинация рецептов.
+    С параметром ?cursor= включается пагинация по ключу:
+    явной сортировке запроса, keyset_ordering вьюсета
+    или (pub_date, id).
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    keyset_ordering = ('-pub_date', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.cursor_query_param not in request.query_params:
+            return super().paginate_queryset(queryset, request, view)
+        ordering = queryset.query.order_by or getattr(
+            view, 'keyset_ordering', self.keyset_ordering
+        )
+        self.keyset = KeysetPagination(
+            ordering=tuple(ordering),
+            page_size=self.get_page_size(request),
+        )
+        return self.keyset.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class PantryPagination(PageNumberPagination):
+    """Подбор по продуктам ранжируется в памяти: только номера страниц."""
+    page_size = 6
+    page_size_query_param = 'limit'
+
+
+class FeedPagination(RecipePagination):
+    """Лента подписок читается только по ключу."""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = KeysetPagination(
+            ordering=tuple(queryset.query.order_by),
+            page_size=self.get_page_size(request),
+        )
+        return self.keyset.paginate_queryset(queryset, request, view)
@@ -1,14 +1,14 @@
-from rest_framework import permissions
-from rest_framework.permissions import SAFE_METHODS
-
-
-class IsAuthorOrReadOnly(permissions.BasePermission):
-    def has_permission(self, request, view):
-        if (request.method in permissions.SAFE_METHODS
-                or request.user.is_authenticated):
-            return True
-
-    def has_object_permission(self, request, view, obj):
-        if (request.method in SAFE_METHODS
-                or obj.author == request.user):
-            return True
+from rest_framework import permissions
+from rest_framework.permissions import SAFE_METHODS
+
+
+class IsAuthorOrReadOnly(permissions.BasePermission):
+    def has_permission(self, request, view):
+        if (request.method in permissions.SAFE_METHODS
+                or request.user.is_authenticated):
+            return True
+
+    def has_object_permission(self, request, view, obj):
+        if (request.method in SAFE_METHODS
+                or obj.author == request.user):
+            return True
@@ -0,0 +1,107 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from foodgram.settings import RECIPE_CACHE_TTL
+
+VERSION_KEY = 'recipes:body:version'
+BODY_KEY = 'recipes:body:{version}:{recipe_id}'
+GENERATION_KEY = 'recipes:body:generation:{recipe_id}'
+
+
+def get_version():
+    # После вытеснения счётчик начнётся с большего значения,
+    # чем любое выданное раньше, и старые тела не найдутся.
+    return cache.get_or_set(VERSION_KEY, time.time_ns, None)
+
+
+def bump_version():
+    """Сбрасывает тела всех рецептов разом."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def get_keys(recipe_ids):
+    version = get_version()
+    return {
+        recipe_id: BODY_KEY.format(version=version, recipe_id=recipe_id)
+        for recipe_id in recipe_ids
+    }
+
+
+def get_generation_keys(recipe_ids):
+    return {
+        recipe_id: GENERATION_KEY.format(recipe_id=recipe_id)
+        for recipe_id in recipe_ids
+    }
+
+
+def get_generations(keys, cached):
+    """Поколения рецептов; вытесненные заводятся заново."""
+    generations = {
+        recipe_id: cached[key]
+        for recipe_id, key in keys.items() if key in cached
+    }
+    missing = [recipe_id for recipe_id in keys
+               if recipe_id not in generations]
+    if missing:
+        for recipe_id in missing:
+            cache.add(keys[recipe_id], time.time_ns(), None)
+        fresh = cache.get_many([keys[recipe_id] for recipe_id in missing])
+        for recipe_id in missing:
+            generations[recipe_id] = fresh.get(keys[recipe_id])
+    return generations
+
+
+def get_bodies(recipe_ids, build):
+    """
+    Тела рецептов по id. Отсутствующие в кеше собираются
+    функцией build одним запросом и сохраняются.
+    Запись хранит поколение рецепта, прочитанное до сборки:
+    тело, собранное до изменения рецепта и сохранённое после
+    invalidate(), уже не принимается.
+    """
+    keys = get_keys(recipe_ids)
+    generation_keys = get_generation_keys(keys)
+    cached = cache.get_many([*keys.values(), *generation_keys.values()])
+    generations = get_generations(generation_keys, cached)
+    bodies = {}
+    for recipe_id, key in keys.items():
+        entry = cached.get(key)
+        if entry is not None and entry[0] == generations[recipe_id]:
+            bodies[recipe_id] = entry[1]
+    missing = [recipe_id for recipe_id in keys if recipe_id not in bodies]
+    if missing:
+        built = build(missing)
+        cache.set_many(
+            {
+                keys[recipe_id]: (generations[recipe_id], body)
+                for recipe_id, body in built.items()
+                if generations[recipe_id] is not None
+            },
+            RECIPE_CACHE_TTL
+        )
+        bodies.update(built)
+    return bodies
+
+
+def invalidate(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    generation = time.time_ns()
+    cache.set_many({
+        key: generation
+        for key in get_generation_keys(recipe_ids).values()
+    }, None)
+    cache.delete_many(list(get_keys(recipe_ids).values()))
+
+
+def invalidate_on_commit(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    if recipe_ids:
+        transaction.on_commit(lambda: invalidate(recipe_ids))
+
+
+def bump_version_on_commit():
+    transaction.on_commit(bump_version)
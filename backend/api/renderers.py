@@ -0,0 +1,135 @@
+import csv
+import io
+import os
+from abc import ABC, abstractmethod
+
+from foodgram.settings import SHOPPING_CART_PDF_FONT
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer
+
+SHOPPING_CART_TITLE = 'Список покупок:'
+PDF_FONT_NAME = 'ShoppingCartFont'
+PDF_FONT_SIZE = 12
+PDF_MARGIN = 50
+PDF_LINE_HEIGHT = 18
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: строка сразу возвращается наружу."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingCartNegotiation(DefaultContentNegotiation):
+    """
+    Формат файла задаёт только ?format=, заголовок Accept не влияет:
+    фронтенд шлёт application/json и получал текстовый файл, а не 406.
+    Без параметра отдаётся первый рендерер (текст).
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        format_query_param = self.settings.URL_FORMAT_OVERRIDE
+        format = (format_suffix
+                  or request.query_params.get(format_query_param))
+        if format:
+            renderers = self.filter_renderers(renderers, format)
+        renderer = renderers[0]
+        return renderer, renderer.media_type
+
+
+class ShoppingCartRenderer(BaseRenderer, ABC):
+    """
+    Базовый рендерер списка покупок.
+    Строки приходят из курсора базы данных; stream() превращает
+    их в части ответа.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Ответы с ошибками выводятся построчно «ключ: значение»."""
+        if isinstance(data, dict):
+            lines = [f'{key}: {value}' for key, value in data.items()]
+        else:
+            lines = [str(data)]
+        return self.render_lines(lines)
+
+    def render_lines(self, lines):
+        return '\n'.join(lines).encode(self.charset)
+
+    def format_row(self, row):
+        name, measurement_unit, total_amount = row
+        return f'{name} - {total_amount}{measurement_unit}.'
+
+    @abstractmethod
+    def stream(self, rows):
+        """Части файла для StreamingHttpResponse."""
+
+
+class PlainTextRenderer(ShoppingCartRenderer):
+    """Список покупок в текстовом файле."""
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows):
+        yield SHOPPING_CART_TITLE + '\n'
+        for row in rows:
+            yield self.format_row(row) + '\n'
+
+
+class CSVRenderer(ShoppingCartRenderer):
+    """Список покупок в CSV."""
+    media_type = 'text/csv'
+    format = 'csv'
+    header = ('Ингредиент', 'Единица измерения', 'Количество')
+
+    def stream(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.header)
+        for row in rows:
+            yield writer.writerow(row)
+
+
+class PDFRenderer(ShoppingCartRenderer):
+    """
+    Список покупок в PDF.
+    Не потоковый: reportlab собирает документ в памяти целиком,
+    поэтому файл отдаётся одним блоком после чтения всего курсора.
+    """
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+    def get_font_name(self):
+        if PDF_FONT_NAME in pdfmetrics.getRegisteredFontNames():
+            return PDF_FONT_NAME
+        if not os.path.exists(SHOPPING_CART_PDF_FONT):
+            return 'Helvetica'
+        pdfmetrics.registerFont(TTFont(PDF_FONT_NAME, SHOPPING_CART_PDF_FONT))
+        return PDF_FONT_NAME
+
+    def render_lines(self, lines):
+        buffer = io.BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        font_name = self.get_font_name()
+        _, height = A4
+        y = height - PDF_MARGIN
+        pdf.setFont(font_name, PDF_FONT_SIZE)
+        for line in lines:
+            if y < PDF_MARGIN:
+                pdf.showPage()
+                pdf.setFont(font_name, PDF_FONT_SIZE)
+                y = height - PDF_MARGIN
+            pdf.drawString(PDF_MARGIN, y, line)
+            y -= PDF_LINE_HEIGHT
+        pdf.save()
+        return buffer.getvalue()
+
+    def stream(self, rows):
+        lines = [SHOPPING_CART_TITLE]
+        lines.extend(self.format_row(row) for row in rows)
+        yield self.render_lines(lines)
@@ -0,0 +1,145 @@
+import hashlib
+import time
+
+from django.core.cache import cache as stats_cache
+from django.core.cache import caches
+from django.http import HttpResponse
+from foodgram.settings import (RESPONSE_CACHE_LOCK_TIMEOUT,
+                               RESPONSE_CACHE_TTL,
+                               RESPONSE_CACHE_WAIT_INTERVAL)
+
+RESPONSE_KEY = 'responses:{endpoint}:{digest}'
+LOCK_KEY = 'responses:lock:{endpoint}:{digest}'
+STATS_KEY = 'responses:stats:{endpoint}:{outcome}'
+HIT = 'hits'
+MISS = 'misses'
+
+cache = caches['responses']
+# Счётчики попаданий - в общем кеше: кеш ответов может быть своим
+# у каждого процесса, а response_cache_stats запускается отдельно.
+
+# Вьюсеты с кешем ответов: endpoint -> список действий.
+endpoints = {}
+
+
+def normalize_query(query_params):
+    """Порядок параметров и пустые значения не влияют на ключ."""
+    return sorted(
+        (name, sorted(value for value in values if value))
+        for name, values in query_params.lists()
+        if any(values)
+    )
+
+
+def make_key(endpoint, parts, template=RESPONSE_KEY):
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return template.format(endpoint=endpoint, digest=digest)
+
+
+def count(endpoint, outcome):
+    key = STATS_KEY.format(endpoint=endpoint, outcome=outcome)
+    if stats_cache.add(key, 1, None):
+        return
+    try:
+        stats_cache.incr(key)
+    except ValueError:
+        stats_cache.set(key, 1, None)
+
+
+def get_stats(endpoint):
+    keys = {
+        outcome: STATS_KEY.format(endpoint=endpoint, outcome=outcome)
+        for outcome in (HIT, MISS)
+    }
+    values = stats_cache.get_many(keys.values())
+    return {outcome: values.get(key, 0) for outcome, key in keys.items()}
+
+
+def reset_stats(endpoint):
+    stats_cache.delete_many([
+        STATS_KEY.format(endpoint=endpoint, outcome=outcome)
+        for outcome in (HIT, MISS)
+    ])
+
+
+def to_response(cached):
+    content, content_type = cached
+    return HttpResponse(content, content_type=content_type)
+
+
+def get_or_build(endpoint, parts, build):
+    """
+    Готовый ответ из кеша или новый от build.
+    Пересобирает ответ один запрос: остальные ждут его результата
+    не дольше RESPONSE_CACHE_LOCK_TIMEOUT, а потом строят сами.
+    """
+    key = make_key(endpoint, parts)
+    cached = cache.get(key)
+    if cached is not None:
+        count(endpoint, HIT)
+        return to_response(cached)
+    lock = make_key(endpoint, parts, LOCK_KEY)
+    deadline = time.monotonic() + RESPONSE_CACHE_LOCK_TIMEOUT
+    locked = cache.add(lock, 1, RESPONSE_CACHE_LOCK_TIMEOUT)
+    while not locked and time.monotonic() < deadline:
+        time.sleep(RESPONSE_CACHE_WAIT_INTERVAL)
+        cached = cache.get(key)
+        if cached is not None:
+            count(endpoint, HIT)
+            return to_response(cached)
+        locked = cache.add(lock, 1, RESPONSE_CACHE_LOCK_TIMEOUT)
+    count(endpoint, MISS)
+    try:
+        response = build()
+        if response.status_code == 200:
+            cache.set(key, (response.content, response['Content-Type']),
+                      RESPONSE_CACHE_TTL)
+    finally:
+        if locked:
+            cache.delete(lock)
+    return response
+
+
+class ResponseCacheMixin:
+    """
+    Кеш готовых ответов для анонимных пользователей.
+    В ключ входят нормализованные параметры запроса и версии данных
+    из get_etag_data (см. ConditionalGetMixin): после изменения
+    данных ответы ищутся по новому ключу, старые вытесняются по TTL.
+    """
+    response_cache_actions = ('list',)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        endpoints[cls.__name__] = cls.response_cache_actions
+
+    def use_response_cache(self, request):
+        return (self.action in self.response_cache_actions
+                and request.user.is_anonymous
+                and request.accepted_renderer.format == 'json')
+
+    def render_response(self, response):
+        response.accepted_renderer = self.request.accepted_renderer
+        response.accepted_media_type = self.request.accepted_media_type
+        response.renderer_context = self.get_renderer_context()
+        return response.render()
+
+    def get_cached_response(self, request, handler, *args, **kwargs):
+        if not self.use_response_cache(request):
+            return handler(request, *args, **kwargs)
+        parts = (
+            # Ссылки в ответе абсолютные.
+            request.build_absolute_uri('/'),
+            sorted(self.kwargs.items()),
+            normalize_query(request.query_params),
+            self.get_etag_data(request),
+        )
+        return get_or_build(
+            f'{type(self).__name__}.{self.action}',
+            parts,
+            lambda: self.render_response(handler(request, *args, **kwargs)),
+        )
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(request, super().list,
+                                        *args, **kwargs)
@@ -1,331 +1,749 @@
-import base64
-
-from django.core.files.base import ContentFile
-from django.db import transaction
-from djoser.serializers import UserSerializer
-from foodgram.settings import (MAX_COOKING_TIME, MAX_INGREDIENT_AMOUNT,
-                               MIN_COOKING_TIME, MIN_INGREDIENT_AMOUNT)
-from recipes.models import (Favorite, Ingredient, IngredientAmount, Recipe,
-                            ShoppingCart, Tag)
-from rest_framework import serializers
-from rest_framework.relations import SlugRelatedField
-from rest_framework.serializers import ValidationError
-from users.models import Subscribe, User
-
-
-class Base64ImageField(serializers.ImageField):
-    """Изображения."""
-    def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-
-        return super().to_internal_value(data)
-
-
-class UserReadSerializer(UserSerializer):
-    """Страница пользователя."""
-    is_subscribed = serializers.SerializerMethodField()
-
-    class Meta:
-        model = User
-        fields = ('id', 'email', 'username', 'first_name',
-                  'last_name', 'is_subscribed')
-
-    def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return Subscribe.objects.filter(
-                user=request.user,
-                author=obj).exists()
-        return False
-
-
-class IngredientSerializer(serializers.ModelSerializer):
-    """Ингредиенты."""
-
-    class Meta:
-        model = Ingredient
-        fields = ('id', 'name', 'measurement_unit')
-
-
-class IngredientsInRecipeSerializer(serializers.ModelSerializer):
-    """Игредиенты в рецепте."""
-    id = serializers.ReadOnlyField(
-        source='ingredient.id',
-    )
-    name = serializers.ReadOnlyField(
-        source='ingredient.name',
-    )
-    measurement_unit = serializers.ReadOnlyField(
-        source='ingredient.measurement_unit',
-    )
-
-    class Meta:
-        model = IngredientAmount
-        fields = ('id', 'name', 'measurement_unit', 'amount')
-
-
-class IngredientInRecipeWriteSerializer(serializers.ModelSerializer):
-    """Игредиенты в рецепте."""
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
-
-    class Meta:
-        model = IngredientAmount
-        fields = ('id', 'amount')
-
-
-class TagSerializer(serializers.ModelSerializer):
-    """Теги."""
-    class Meta:
-        model = Tag
-        fields = ('id', 'name', 'color', 'slug')
-
-
-class RecipeCreateSerializer(serializers.ModelSerializer):
-    """Серилизатор для создания рецепта."""
-    image = Base64ImageField()
-    author = SlugRelatedField(
-        slug_field='username',
-        read_only=True
-    )
-    ingredients = IngredientInRecipeWriteSerializer(
-        many=True
-    )
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True
-    )
-
-    class Meta:
-        model = Recipe
-        fields = ('id', 'ingredients', 'tags',
-                  'image', 'name', 'text',
-                  'cooking_time', 'author')
-
-    def create_ingredients_amount(self, ingredients, recipe):
-        IngredientAmount.objects.bulk_create([
-            IngredientAmount(
-                ingredient=ingredient.get('id'),
-                recipe=recipe,
-                amount=ingredient.get('amount')
-            )
-            for ingredient in ingredients
-        ])
-
-    @transaction.atomic
-    def create(self, validated_data):
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
-        recipe = Recipe.objects.create(**validated_data)
-        recipe.tags.set(tags)
-        self.create_ingredients_amount(ingredients, recipe)
-        return recipe
-
-    @transaction.atomic
-    def update(self, instance, validated_data):
-        recipe = instance
-        instance.image = validated_data.get('image', instance.image)
-        instance.name = validated_data.get('name', instance.name)
-        instance.text = validated_data.get('text', instance.name)
-        instance.cooking_time = validated_data.get('cooking_time',
-                                                   instance.cooking_time)
-        tags = validated_data.get('tags')
-        if tags is not None:
-            instance.tags.clear()
-            instance.tags.set(tags)
-        ingredients = validated_data.get('ingredients')
-        if ingredients is not None:
-            instance.ingredients.clear()
-            IngredientAmount.objects.filter(recipe=recipe).delete()
-            self.create_ingredients_amount(ingredients, recipe)
-        instance.save()
-        return instance
-
-    def to_representation(self, instance):
-        return RecipeReadSerializer(instance, context={
-            'request': self.context.get('request')
-        }).data
-
-    def validate_ingredients(self, ingredients):
-        if not ingredients:
-            raise ValidationError('Необходимо ввести ингредиент')
-        attrs_data = (attr.get('id',) for attr in ingredients)
-        if len(attrs_data) != len(set(attrs_data)):
-            raise ValidationError(
-                'Ингредиенты для рецепта не должны повторяться')
-        for attr in ingredients:
-            if int(attr.get('amount')) < MIN_INGREDIENT_AMOUNT:
-                raise ValidationError('Неверевное количество ингредиента')
-        return ingredients
-
-    def validate_tags(self, tags):
-        if not tags:
-            raise ValidationError('Необходимо ввести теги')
-        attrs_data = (attr.id for attr in tags)
-        if len(attrs_data) != len(set(attrs_data)):
-            raise ValidationError(
-                'Теги для рецепта не должны повторяться'
-            )
-        return tags
-
-    def validate_min_max_ingredients(self, ingredients):
-        if len(ingredients) < MIN_INGREDIENT_AMOUNT:
-            raise ValidationError(f'Минимальное количество ингредиентов:'
-                                  f'{MIN_INGREDIENT_AMOUNT}')
-        if len(ingredients) > MAX_INGREDIENT_AMOUNT:
-            raise ValidationError(f'Максимальное количество ингредиентов:'
-                                  f'{MAX_INGREDIENT_AMOUNT}')
-        return ingredients
-
-    def validate_cooking_time(self, cooking_time):
-        if cooking_time < MIN_COOKING_TIME:
-            raise ValidationError(f'Минимальное время готовки:'
-                                  f'{MIN_COOKING_TIME} минута')
-        if cooking_time > MAX_COOKING_TIME:
-            raise ValidationError(f'Максимальное время готовки:'
-                                  f'{MAX_COOKING_TIME} минут (10 часов)')
-        return cooking_time
-
-    def validate_duplicate_ingredients(self, ingredients):
-        attrs_data = [attr.get('id') for attr in ingredients]
-        if len(attrs_data) != len(set(attrs_data)):
-            raise ValidationError('Ингредиенты для рецепта'
-                                  'не должны повторяться')
-        if not ingredients:
-            raise ValidationError('Нельзя создать рецепт без ингредиента')
-        return ingredients
-
-
-class RecipeSerializer(serializers.ModelSerializer):
-    """Серилизатор рецептов."""
-    image = Base64ImageField(read_only=True)
-    name = serializers.ReadOnlyField()
-    cooking_time = serializers.ReadOnlyField()
-
-    class Meta:
-        model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
-
-
-class RecipeIngredientSerializer(serializers.ModelSerializer):
-    """Игредиенты в рецепте."""
-    id = serializers.ReadOnlyField(
-        source='ingredient.id'
-    )
-    name = serializers.ReadOnlyField(
-        source='ingredient.name'
-    )
-    measurement_unit = serializers.ReadOnlyField(
-        source='ingredient.measurement_unit'
-    )
-
-    class Meta:
-        model = IngredientAmount
-        fields = ('id', 'name', 'measurement_unit', 'amount')
-
-
-class RecipeShopSerializer(serializers.ModelSerializer):
-    """Cериализатор для списка покупок."""
-    name = serializers.ReadOnlyField()
-    cooking_time = serializers.ReadOnlyField()
-    image = Base64ImageField(read_only=True)
-
-    class Meta:
-        model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
-
-
-class RecipeReadSerializer(serializers.ModelSerializer):
-    """Просмотр рецепта."""
-    tags = TagSerializer(
-        many=True,
-    )
-    ingredients = IngredientsInRecipeSerializer(
-        many=True,
-        source='recipes'
-    )
-    author = UserReadSerializer()
-    is_favorited = serializers.SerializerMethodField()
-    is_in_shopping_cart = serializers.SerializerMethodField()
-
-    class Meta:
-        model = Recipe
-        fields = (
-            'id', 'tags', 'author', 'ingredients',
-            'is_favorited',
-            'name', 'image', 'text', 'cooking_time',
-            'is_in_shopping_cart',
-        )
-
-    def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if request.user.is_anonymous:
-            return False
-        return Favorite.objects.filter(recipe=obj,
-                                       user=request.user).exists()
-
-    def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        if not request or request.user.is_anonymous:
-            return False
-        return ShoppingCart.objects.filter(recipe=obj,
-                                           user=request.user).exists()
-
-
-class SubscribeSerializer(serializers.ModelSerializer):
-    """
-    Данные о пользователе, на которого
-    сделана подписка.
-    """
-    recipes_count = serializers.SerializerMethodField()
-    is_subscribed = serializers.SerializerMethodField()
-    recipes = serializers.SerializerMethodField()
-
-    class Meta:
-        model = User
-        fields = (
-            'email',
-            'id',
-            'username',
-            'first_name',
-            'last_name',
-            'is_subscribed',
-            'recipes',
-            'recipes_count',
-        )
-
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj).count()
-
-    def get_is_subscribed(self, obj):
-        user = self.context('request').user
-        if user.is_anonymous:
-            return False
-        return Subscribe.objects.filter(user=user, author=obj).exists()
-
-    def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit_recipes = request.query_params.get('recipes_limit')
-        if limit_recipes is not None:
-            recipes = obj.author.all()[:(int(limit_recipes))]
-        else:
-            recipes = obj.favorite_recipes.all()
-        context = {'request': request}
-        return RecipeShortSerializer(recipes, many=True,
-                                     context=context).data
-
-
-class RecipeShortSerializer(serializers.ModelSerializer):
-    """Класс сериализатора для представления краткой версии рецепта."""
-    image = Base64ImageField()
-
-    class Meta:
-        model = Recipe
-        fields = (
-            'id',
-            'name',
-            'image',
-            'cooking_time'
-        )
+import base64
+import binascii
+import json
+
+from api import recipe_cache
+from django import forms
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db import transaction
+from django.core.files.storage import default_storage
+from django.db.models import Prefetch
+from django.urls import reverse
+from djoser.serializers import UserSerializer
+from foodgram.settings import (MAX_COOKING_TIME, MAX_INGREDIENT_AMOUNT,
+                               MIN_COOKING_TIME, MIN_INGREDIENT_AMOUNT,
+                               PANTRY_MAX_INGREDIENTS, RECIPE_IMAGE_FORMATS,
+                               RECIPE_IMAGE_MAX_SIZE, RECIPE_IMAGE_SIZES)
+from recipes import thumbnails
+from recipes.models import (Favorite, Ingredient, IngredientAmount, Recipe,
+                            ShoppingCart, ShoppingListItem, SimilarRecipe,
+                            Tag)
+from rest_framework import serializers
+from rest_framework.relations import SlugRelatedField
+from rest_framework.serializers import ValidationError
+from users.models import Subscribe, User
+
+BASE64_CHUNK_SIZE = 64 * 1024
+IMAGE_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png'}
+IMAGE_TOO_LARGE = (
+    f'Размер изображения больше {RECIPE_IMAGE_MAX_SIZE // (1024 * 1024)} МБ.'
+)
+INVALID_BASE64 = 'Некорректная строка base64.'
+
+
+def get_recipes_limit(request):
+    """Значение параметра recipes_limit или None."""
+    try:
+        recipes_limit = int(request.query_params['recipes_limit'])
+    except (KeyError, ValueError):
+        return None
+    return max(recipes_limit, 0)
+
+
+def get_subscribed_author_ids(request):
+    """
+    Id авторов, на которых подписан текущий пользователь.
+    Загружаются один раз за запрос и общие для всех сериализаторов.
+    """
+    if not hasattr(request, 'subscribed_author_ids'):
+        request.subscribed_author_ids = set(
+            Subscribe.objects.filter(user=request.user)
+            .values_list('author_id', flat=True)
+        )
+    return request.subscribed_author_ids
+
+
+def decode_base64_file(encoded, max_size):
+    """
+    Декодирует base64 частями во временный файл на диске,
+    не создавая в памяти второй полной копии изображения.
+    """
+    if len(encoded) * 3 // 4 > max_size + 2:
+        raise ValidationError(IMAGE_TOO_LARGE)
+    file = TemporaryUploadedFile('image', 'application/octet-stream', 0,
+                                 None)
+    carry, size = '', 0
+    try:
+        for start in range(0, len(encoded), BASE64_CHUNK_SIZE):
+            chunk = carry + ''.join(
+                encoded[start:start + BASE64_CHUNK_SIZE].split()
+            )
+            whole = len(chunk) - len(chunk) % 4
+            chunk, carry = chunk[:whole], chunk[whole:]
+            try:
+                decoded = base64.b64decode(chunk, validate=True)
+            except binascii.Error:
+                raise ValidationError(INVALID_BASE64)
+            size += len(decoded)
+            if size > max_size:
+                raise ValidationError(IMAGE_TOO_LARGE)
+            file.write(decoded)
+        if carry:
+            raise ValidationError(INVALID_BASE64)
+    except ValidationError:
+        file.close()
+        raise
+    file.size = size
+    file.seek(0)
+    return file
+
+
+def get_image_urls(recipe, request=None):
+    """
+    Ссылки на уменьшенные копии изображения: {ширина: {формат: url}}.
+    Пока копии не построены, ссылки ведут на действие image,
+    которое построит нужную копию при первом запросе.
+    """
+    if not recipe.image:
+        return {}
+    if thumbnails.is_ready(recipe):
+        urls = {
+            size: {
+                extension: default_storage.url(name)
+                for extension, name in formats.items()
+            }
+            for size, formats in recipe.image_derivatives.items()
+            if size != 'source'
+        }
+    else:
+        base = reverse('api:recipe-image', kwargs={'pk': recipe.pk})
+        urls = {
+            str(size): {
+                extension: f'{base}?size={size}&ext={extension}'
+                for extension in RECIPE_IMAGE_FORMATS
+            }
+            for size in RECIPE_IMAGE_SIZES
+        }
+    if request is not None:
+        urls = {
+            size: {
+                extension: request.build_absolute_uri(url)
+                for extension, url in formats.items()
+            }
+            for size, formats in urls.items()
+        }
+    return urls
+
+
+def load_json(key, value):
+    try:
+        return json.loads(value)
+    except ValueError:
+        raise ValidationError({key: 'Некорректный JSON.'})
+
+
+def is_json(value, start):
+    return isinstance(value, str) and value.lstrip().startswith(start)
+
+
+def multipart_to_dict(data, list_fields):
+    """
+    Данные multipart/form-data в виде обычного словаря.
+    Поля list_fields всегда списки: значение-строка '[...]'
+    разбирается как JSON-массив, иначе берутся все повторы поля,
+    а элементы-строки '{...}' разбираются как JSON-объекты.
+    Остальные поля - последнее значение, как в QueryDict.
+    """
+    result = {}
+    for key, values in data.lists():
+        if key not in list_fields:
+            result[key] = values[-1]
+        elif len(values) == 1 and is_json(values[0], '['):
+            result[key] = load_json(key, values[0])
+        else:
+            result[key] = [
+                load_json(key, value) if is_json(value, '{') else value
+                for value in values
+            ]
+    return result
+
+
+class PillowImageField(forms.ImageField):
+    """Формат проверяется Pillow, а не по расширению в имени файла."""
+    default_validators = []
+
+
+class Base64ImageField(serializers.ImageField):
+    """
+    Изображения.
+    Принимает файл из multipart/form-data или строку data:...;base64.
+    Формат определяет Pillow, по нему же выбирается расширение файла.
+    """
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('_DjangoImageField', PillowImageField)
+        super().__init__(*args, **kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) and data.startswith('data:'):
+            _, _, encoded = data.partition(';base64,')
+            data = decode_base64_file(encoded, RECIPE_IMAGE_MAX_SIZE)
+        elif getattr(data, 'size', 0) > RECIPE_IMAGE_MAX_SIZE:
+            raise ValidationError(IMAGE_TOO_LARGE)
+        file = super().to_internal_value(data)
+        ext = IMAGE_EXTENSIONS.get(file.image.format)
+        if ext is None:
+            raise ValidationError(
+                f'Неподдерживаемый формат изображения: {file.image.format}.'
+            )
+        file.name = f'image.{ext}'
+        return file
+
+
+class UserReadSerializer(UserSerializer):
+    """Страница пользователя."""
+    is_subscribed = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = ('id', 'email', 'username', 'first_name',
+                  'last_name', 'is_subscribed')
+
+    def get_is_subscribed(self, obj):
+        request = self.context.get('request')
+        if request and request.user.is_authenticated:
+            return obj.id in get_subscribed_author_ids(request)
+        return False
+
+
+class IngredientSerializer(serializers.ModelSerializer):
+    """Ингредиенты."""
+
+    class Meta:
+        model = Ingredient
+        fields = ('id', 'name', 'measurement_unit')
+
+
+class IngredientsInRecipeSerializer(serializers.ModelSerializer):
+    """Игредиенты в рецепте."""
+    id = serializers.ReadOnlyField(
+        source='ingredient.id',
+    )
+    name = serializers.ReadOnlyField(
+        source='ingredient.name',
+    )
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit',
+    )
+
+    class Meta:
+        model = IngredientAmount
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+
+
+def resolve_pks(queryset, pks):
+    """
+    Объекты по списку id одним запросом pk__in.
+    Все несуществующие id перечисляются в одной ошибке.
+    """
+    objects = queryset.in_bulk(set(pks))
+    missing = sorted({pk for pk in pks if pk not in objects})
+    if missing:
+        raise ValidationError(
+            'Несуществующие id: ' + ', '.join(map(str, missing))
+        )
+    return [objects[pk] for pk in pks]
+
+
+class BulkPrimaryKeyRelatedField(serializers.ListField):
+    """Список id связанных объектов, проверяемых одним запросом."""
+    child = serializers.IntegerField(min_value=1)
+
+    def __init__(self, queryset, **kwargs):
+        self.queryset = queryset
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        return resolve_pks(self.queryset.all(),
+                           super().to_internal_value(data))
+
+    def to_representation(self, value):
+        return [item.pk for item in value.all()]
+
+
+class IngredientInRecipeListSerializer(serializers.ListSerializer):
+    """Ингредиенты рецепта: все id проверяются одним запросом."""
+
+    def to_internal_value(self, data):
+        ingredients = super().to_internal_value(data)
+        objects = resolve_pks(
+            Ingredient.objects.all(),
+            [ingredient['id'] for ingredient in ingredients]
+        )
+        for ingredient, obj in zip(ingredients, objects):
+            ingredient['id'] = obj
+        return ingredients
+
+
+class IngredientInRecipeWriteSerializer(serializers.ModelSerializer):
+    """Игредиенты в рецепте."""
+    id = serializers.IntegerField(min_value=1)
+
+    class Meta:
+        model = IngredientAmount
+        fields = ('id', 'amount')
+        list_serializer_class = IngredientInRecipeListSerializer
+
+
+class TagSerializer(serializers.ModelSerializer):
+    """Теги."""
+    class Meta:
+        model = Tag
+        fields = ('id', 'name', 'color', 'slug')
+
+
+class RecipeCreateSerializer(serializers.ModelSerializer):
+    """Серилизатор для создания рецепта."""
+    image = Base64ImageField()
+    author = SlugRelatedField(
+        slug_field='username',
+        read_only=True
+    )
+    ingredients = IngredientInRecipeWriteSerializer(
+        many=True
+    )
+    tags = BulkPrimaryKeyRelatedField(
+        queryset=Tag.objects.all()
+    )
+
+    multipart_list_fields = ('ingredients', 'tags')
+
+    class Meta:
+        model = Recipe
+        fields = ('id', 'ingredients', 'tags',
+                  'image', 'name', 'text',
+                  'cooking_time', 'author')
+
+    def to_internal_value(self, data):
+        """
+        В multipart/form-data списки передаются строкой JSON
+        или повторяющимся полем (tags=1&tags=2, в том числе одним).
+        """
+        if hasattr(data, 'getlist'):
+            data = multipart_to_dict(data, self.multipart_list_fields)
+        return super().to_internal_value(data)
+
+    def save(self, **kwargs):
+        """Временный файл изображения закрывается после сохранения."""
+        try:
+            return super().save(**kwargs)
+        finally:
+            image = self.validated_data.get('image')
+            if image is not None:
+                image.close()
+
+    def create_ingredients_amount(self, ingredients, recipe):
+        IngredientAmount.objects.bulk_create([
+            IngredientAmount(
+                ingredient=ingredient.get('id'),
+                recipe=recipe,
+                amount=ingredient.get('amount')
+            )
+            for ingredient in ingredients
+        ])
+
+    @transaction.atomic
+    def create(self, validated_data):
+        tags = validated_data.pop('tags')
+        ingredients = validated_data.pop('ingredients')
+        recipe = Recipe.objects.create(**validated_data)
+        recipe.tags.set(tags)
+        self.create_ingredients_amount(ingredients, recipe)
+        return recipe
+
+    def update_ingredients_amount(self, ingredients, recipe):
+        """
+        Приводит состав рецепта к ingredients, записывая только
+        добавленные, изменённые и удалённые строки.
+        Удалённые строки вычитает из списков покупок сигнал,
+        а записанные пачкой - change_recipe.
+        """
+        new_amounts = {
+            ingredient.get('id').id: ingredient.get('amount')
+            for ingredient in ingredients
+        }
+        current, to_delete = {}, []
+        for item in IngredientAmount.objects.filter(recipe=recipe):
+            if (item.ingredient_id in current
+                    or item.ingredient_id not in new_amounts):
+                to_delete.append(item.pk)
+            else:
+                current[item.ingredient_id] = item
+        old_amounts, to_update = {}, []
+        for ingredient_id, item in current.items():
+            old_amounts[ingredient_id] = item.amount
+            if item.amount != new_amounts[ingredient_id]:
+                item.amount = new_amounts[ingredient_id]
+                to_update.append(item)
+        to_create = [
+            IngredientAmount(recipe=recipe, ingredient_id=ingredient_id,
+                             amount=amount)
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in current
+        ]
+        if to_delete:
+            IngredientAmount.objects.filter(pk__in=to_delete).delete()
+        if to_update:
+            IngredientAmount.objects.bulk_update(to_update, ('amount',))
+        if to_create:
+            IngredientAmount.objects.bulk_create(to_create)
+        ShoppingListItem.objects.change_recipe(recipe, old_amounts,
+                                               new_amounts)
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        recipe = instance
+        instance.image = validated_data.get('image', instance.image)
+        instance.name = validated_data.get('name', instance.name)
+        instance.text = validated_data.get('text', instance.text)
+        instance.cooking_time = validated_data.get('cooking_time',
+                                                   instance.cooking_time)
+        tags = validated_data.get('tags')
+        if tags is not None:
+            instance.tags.set(tags)
+        ingredients = validated_data.get('ingredients')
+        if ingredients is not None:
+            self.update_ingredients_amount(ingredients, recipe)
+        instance.save()
+        return instance
+
+    def to_representation(self, instance):
+        return RecipeReadSerializer(instance, context={
+            'request': self.context.get('request')
+        }).data
+
+    def validate_ingredients(self, ingredients):
+        if not ingredients:
+            raise ValidationError('Необходимо ввести ингредиент')
+        self.validate_min_max_ingredients(ingredients)
+        attrs_data = [attr.get('id').id for attr in ingredients]
+        if len(attrs_data) != len(set(attrs_data)):
+            raise ValidationError(
+                'Ингредиенты для рецепта не должны повторяться')
+        for attr in ingredients:
+            if int(attr.get('amount')) < MIN_INGREDIENT_AMOUNT:
+                raise ValidationError('Неверевное количество ингредиента')
+        return ingredients
+
+    def validate_tags(self, tags):
+        if not tags:
+            raise ValidationError('Необходимо ввести теги')
+        attrs_data = [attr.id for attr in tags]
+        if len(attrs_data) != len(set(attrs_data)):
+            raise ValidationError(
+                'Теги для рецепта не должны повторяться'
+            )
+        return tags
+
+    def validate_min_max_ingredients(self, ingredients):
+        if len(ingredients) < MIN_INGREDIENT_AMOUNT:
+            raise ValidationError(f'Минимальное количество ингредиентов:'
+                                  f'{MIN_INGREDIENT_AMOUNT}')
+        if len(ingredients) > MAX_INGREDIENT_AMOUNT:
+            raise ValidationError(f'Максимальное количество ингредиентов:'
+                                  f'{MAX_INGREDIENT_AMOUNT}')
+        return ingredients
+
+    def validate_cooking_time(self, cooking_time):
+        if cooking_time < MIN_COOKING_TIME:
+            raise ValidationError(f'Минимальное время готовки:'
+                                  f'{MIN_COOKING_TIME} минута')
+        if cooking_time > MAX_COOKING_TIME:
+            raise ValidationError(f'Максимальное время готовки:'
+                                  f'{MAX_COOKING_TIME} минут (10 часов)')
+        return cooking_time
+
+    def validate_duplicate_ingredients(self, ingredients):
+        attrs_data = [attr.get('id') for attr in ingredients]
+        if len(attrs_data) != len(set(attrs_data)):
+            raise ValidationError('Ингредиенты для рецепта'
+                                  'не должны повторяться')
+        if not ingredients:
+            raise ValidationError('Нельзя создать рецепт без ингредиента')
+        return ingredients
+
+
+class RecipeSerializer(serializers.ModelSerializer):
+    """Серилизатор рецептов."""
+    image = Base64ImageField(read_only=True)
+    name = serializers.ReadOnlyField()
+    cooking_time = serializers.ReadOnlyField()
+
+    class Meta:
+        model = Recipe
+        fields = ('id', 'name', 'image', 'cooking_time')
+
+
+class RecipeIngredientSerializer(serializers.ModelSerializer):
+    """Игредиенты в рецепте."""
+    id = serializers.ReadOnlyField(
+        source='ingredient.id'
+    )
+    name = serializers.ReadOnlyField(
+        source='ingredient.name'
+    )
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
+    )
+
+    class Meta:
+        model = IngredientAmount
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+
+
+class RecipeShopSerializer(serializers.ModelSerializer):
+    """Cериализатор для списка покупок."""
+    name = serializers.ReadOnlyField()
+    cooking_time = serializers.ReadOnlyField()
+    image = Base64ImageField(read_only=True)
+    images = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Recipe
+        fields = ('id', 'name', 'image', 'images', 'cooking_time')
+
+    def get_images(self, obj):
+        return get_image_urls(obj, self.context.get('request'))
+
+
+class SimilarRecipeSerializer(serializers.ModelSerializer):
+    """Краткая версия похожего рецепта со степенью сходства."""
+    id = serializers.ReadOnlyField(source='similar.id')
+    name = serializers.ReadOnlyField(source='similar.name')
+    image = Base64ImageField(source='similar.image', read_only=True)
+    cooking_time = serializers.ReadOnlyField(source='similar.cooking_time')
+    images = serializers.SerializerMethodField()
+
+    class Meta:
+        model = SimilarRecipe
+        fields = ('id', 'name', 'image', 'images', 'cooking_time', 'score')
+
+    def get_images(self, obj):
+        return get_image_urls(obj.similar, self.context.get('request'))
+
+
+class RecipeAuthorSerializer(serializers.ModelSerializer):
+    """Автор рецепта без данных, зависящих от пользователя."""
+
+    class Meta:
+        model = User
+        fields = ('id', 'email', 'username', 'first_name', 'last_name')
+
+
+class RecipeBodySerializer(serializers.ModelSerializer):
+    """
+    Общая для всех пользователей часть рецепта.
+    Кешируется; изображение хранится относительной ссылкой.
+    """
+    tags = TagSerializer(
+        many=True,
+    )
+    ingredients = IngredientsInRecipeSerializer(
+        many=True,
+        source='recipes'
+    )
+    author = RecipeAuthorSerializer()
+
+    class Meta:
+        model = Recipe
+        fields = (
+            'id', 'tags', 'author', 'ingredients',
+            'name', 'image', 'text', 'cooking_time',
+        )
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """Список рецептов: тела из кеша, флаги пользователя пачкой."""
+
+    def to_representation(self, data):
+        return self.child.represent(list(data))
+
+
+class RecipeReadSerializer(serializers.ModelSerializer):
+    """
+    Просмотр рецепта.
+    Тело рецепта берётся из кеша, поверх него накладываются
+    is_favorited, is_in_shopping_cart и author.is_subscribed.
+    Объявленные поля описывают ответ для схемы и браузерного API,
+    сам ответ собирает represent.
+    """
+    tags = TagSerializer(
+        many=True,
+    )
+    ingredients = IngredientsInRecipeSerializer(
+        many=True,
+        source='recipes'
+    )
+    author = UserReadSerializer()
+    is_favorited = serializers.BooleanField(read_only=True)
+    is_in_shopping_cart = serializers.BooleanField(read_only=True)
+    images = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Recipe
+        fields = (
+            'id', 'tags', 'author', 'ingredients',
+            'is_favorited',
+            'name', 'image', 'images', 'text', 'cooking_time',
+            'is_in_shopping_cart',
+        )
+        list_serializer_class = RecipeListSerializer
+
+    def get_images(self, obj):
+        return get_image_urls(obj, self.context.get('request'))
+
+    def to_representation(self, instance):
+        return self.represent([instance])[0]
+
+    def build_bodies(self, recipe_ids):
+        recipes = Recipe.objects.filter(
+            id__in=recipe_ids
+        ).defer('search_vector').select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'recipes',
+                queryset=IngredientAmount.objects.select_related('ingredient')
+            ),
+        )
+        return {
+            recipe.id: RecipeBodySerializer(recipe).data
+            for recipe in recipes
+        }
+
+    def get_user_flags(self, recipes, user):
+        """Id рецептов в избранном и в корзине пользователя."""
+        if user is None or user.is_anonymous:
+            return set(), set()
+        if all(hasattr(recipe, 'is_favorited') for recipe in recipes):
+            return (
+                {recipe.id for recipe in recipes if recipe.is_favorited},
+                {recipe.id for recipe in recipes
+                 if recipe.is_in_shopping_cart},
+            )
+        recipe_ids = [recipe.id for recipe in recipes]
+        return (
+            set(Favorite.objects.filter(
+                user=user, recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True)),
+            set(ShoppingCart.objects.filter(
+                user=user, recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True)),
+        )
+
+    def represent(self, recipes):
+        request = self.context.get('request')
+        user = request.user if request else None
+        bodies = recipe_cache.get_bodies(
+            [recipe.id for recipe in recipes], self.build_bodies
+        )
+        favorited, in_shopping_cart = self.get_user_flags(recipes, user)
+        subscribed = set()
+        if user is not None and user.is_authenticated:
+            subscribed = get_subscribed_author_ids(request)
+        result = []
+        for recipe in recipes:
+            body = bodies.get(recipe.id)
+            if body is None:
+                continue
+            image = body['image']
+            if request is not None and image:
+                image = request.build_absolute_uri(image)
+            result.append({
+                'id': body['id'],
+                'tags': body['tags'],
+                'author': {
+                    **body['author'],
+                    'is_subscribed': body['author']['id'] in subscribed,
+                },
+                'ingredients': body['ingredients'],
+                'is_favorited': recipe.id in favorited,
+                'name': body['name'],
+                'image': image,
+                'images': self.get_images(recipe),
+                'text': body['text'],
+                'cooking_time': body['cooking_time'],
+                'is_in_shopping_cart': recipe.id in in_shopping_cart,
+            })
+        return result
+
+
+class SubscribeSerializer(serializers.ModelSerializer):
+    """
+    Данные о пользователе, на которого
+    сделана подписка.
+    """
+    recipes_count = serializers.SerializerMethodField()
+    is_subscribed = serializers.SerializerMethodField()
+    recipes = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = (
+            'email',
+            'id',
+            'username',
+            'first_name',
+            'last_name',
+            'is_subscribed',
+            'recipes',
+            'recipes_count',
+        )
+
+    def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
+        return Recipe.objects.filter(author=obj).count()
+
+    def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        user = self.context.get('request').user
+        if user.is_anonymous:
+            return False
+        return Subscribe.objects.filter(user=user, author=obj).exists()
+
+    def get_recipes(self, obj):
+        request = self.context.get('request')
+        if hasattr(obj, 'limited_recipes'):
+            recipes = obj.limited_recipes
+        else:
+            recipes = obj.author.all()
+            recipes_limit = get_recipes_limit(request)
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
+        context = {'request': request}
+        return RecipeShortSerializer(recipes, many=True,
+                                     context=context).data
+
+
+class RecipeShortSerializer(serializers.ModelSerializer):
+    """Класс сериализатора для представления краткой версии рецепта."""
+    image = Base64ImageField()
+    images = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Recipe
+        fields = (
+            'id',
+            'name',
+            'image',
+            'images',
+            'cooking_time'
+        )
+
+    def get_images(self, obj):
+        return get_image_urls(obj, self.context.get('request'))
+
+
+class PantrySerializer(serializers.Serializer):
+    """Параметры подбора рецептов по имеющимся продуктам."""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=PANTRY_MAX_INGREDIENTS,
+    )
+    max_missing = serializers.IntegerField(min_value=0, required=False)
+
+
+class CatalogSyncSerializer(serializers.Serializer):
+    """Параметры синхронизации справочника."""
+    since = serializers.IntegerField(min_value=0)
@@ -0,0 +1,74 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from recipes.models import Ingredient, IngredientAmount, Recipe, Tag
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+from api import recipe_cache
+from api.authentication import token_cache
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    token_cache.delete_on_commit(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    if created:
+        return
+    for key in Token.objects.filter(user=instance).values_list(
+        'key', flat=True
+    ):
+        token_cache.delete_on_commit(key)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_body(sender, instance, **kwargs):
+    recipe_cache.invalidate_on_commit((instance.id,))
+
+
+@receiver(post_save, sender=IngredientAmount)
+@receiver(post_delete, sender=IngredientAmount)
+def invalidate_recipe_body_ingredients(sender, instance, **kwargs):
+    recipe_cache.invalidate_on_commit((instance.recipe_id,))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_body_tags(sender, instance, action, reverse, pk_set,
+                                **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        recipe_cache.invalidate_on_commit((instance.id,))
+    elif pk_set:
+        recipe_cache.invalidate_on_commit(pk_set)
+    else:
+        recipe_cache.bump_version_on_commit()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_recipe_bodies_tag(sender, **kwargs):
+    recipe_cache.bump_version_on_commit()
+
+
+@receiver(post_save, sender=Ingredient)
+def invalidate_recipe_bodies_ingredient(sender, instance, created, **kwargs):
+    if created:
+        return
+    recipe_cache.invalidate_on_commit(
+        IngredientAmount.objects.filter(ingredient=instance)
+        .values_list('recipe_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=User)
+def invalidate_recipe_bodies_author(sender, instance, created, update_fields,
+                                    **kwargs):
+    if created or update_fields == frozenset(('last_login',)):
+        return
+    recipe_cache.invalidate_on_commit(
+        Recipe.objects.filter(author=instance).values_list('id', flat=True)
+    )
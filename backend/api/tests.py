@@ -0,0 +1,232 @@
+from io import StringIO
+from unittest import mock
+
+from django.core import serializers
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from recipes.models import (Favorite, FeedItem, Ingredient, IngredientAmount,
+                            Recipe, ShoppingCart, ShoppingListItem, Tag)
+from rest_framework.test import APIClient
+from users.models import Subscribe, User
+
+from api import recipe_cache, response_cache
+from api.middleware import QueryBudgetExceeded
+from api.views import RecipeViewSet
+
+LOCMEM = 'django.core.cache.backends.locmem.LocMemCache'
+RECIPES_COUNT = 120
+
+
+TEST_CACHES = {
+    'default': {'BACKEND': LOCMEM, 'LOCATION': 'tests'},
+    'responses': {'BACKEND': LOCMEM, 'LOCATION': 'tests-responses'},
+}
+
+
+@override_settings(CACHES=TEST_CACHES, QUERY_BUDGET_ENFORCE=True)
+class RecipeListQueriesTest(TestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        authors = [
+            User.objects.create_user(
+                email=f'author{number}@foodgram.ru',
+                username=f'author{number}',
+                first_name='Автор',
+                last_name=str(number),
+                password='password',
+            )
+            for number in range(3)
+        ]
+        cls.user = User.objects.create_user(
+            email='user@foodgram.ru',
+            username='user',
+            first_name='Пользователь',
+            last_name='Тестовый',
+            password='password',
+        )
+        tags = [
+            Tag.objects.create(name=f'Тег {number}', color=f'#00000{number}',
+                               slug=f'tag{number}')
+            for number in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {number}',
+                                      measurement_unit='г')
+            for number in range(10)
+        ]
+        for number in range(RECIPES_COUNT):
+            recipe = Recipe.objects.create(
+                author=authors[number % len(authors)],
+                name=f'Рецепт {number}',
+                text='Описание',
+                cooking_time=10,
+            )
+            recipe.tags.set(tags[:number % len(tags) + 1])
+            IngredientAmount.objects.bulk_create(
+                IngredientAmount(recipe=recipe,
+                                 ingredient=ingredients[(number + shift) % 10],
+                                 amount=shift + 1)
+                for shift in range(3)
+            )
+            if number % 2:
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+            if number % 3 == 0:
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        Subscribe.objects.create(user=cls.user, author=authors[0])
+
+    def setUp(self):
+        # Каждый запрос собирает ответ с нуля. Кеш ответов создан
+        # при импорте и не подменяется настройками.
+        cache.clear()
+        response_cache.cache.clear()
+        self.anonymous = APIClient()
+        self.authorized = APIClient()
+        self.authorized.force_authenticate(self.user)
+
+    def assert_list_queries(self, client, queries):
+        for limit in (6, 100):
+            with self.subTest(limit=limit):
+                with self.assertNumQueries(queries):
+                    response = client.get('/api/recipes/', {'limit': limit})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_anonymous_list(self):
+        # COUNT, страница рецептов, тела: рецепты, теги, ингредиенты.
+        self.assert_list_queries(self.anonymous, 5)
+
+    def test_authorized_list(self):
+        # Плюс подписки пользователя; флаги приходят аннотациями.
+        self.assert_list_queries(self.authorized, 6)
+
+    def test_query_budget_exceeded(self):
+        with mock.patch.dict(RecipeViewSet.query_budgets, {'list': 2}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.anonymous.get('/api/recipes/', {'limit': 6})
+
+    def test_download_shopping_cart_formats(self):
+        url = '/api/recipes/download_shopping_cart/'
+        cases = (
+            ({'HTTP_ACCEPT': 'application/json'}, {}, 'text/plain'),
+            ({}, {}, 'text/plain'),
+            ({'HTTP_ACCEPT': 'application/json'}, {'format': 'csv'},
+             'text/csv'),
+            ({}, {'format': 'pdf'}, 'application/pdf'),
+        )
+        for headers, params, media_type in cases:
+            with self.subTest(headers=headers, params=params):
+                response = self.authorized.get(url, params, **headers)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(
+                    response['Content-Type'].startswith(media_type)
+                )
+                b''.join(response.streaming_content)
+
+    def test_response_cache_stats(self):
+        for _ in range(2):
+            self.anonymous.get('/api/recipes/', {'limit': 6})
+        # Команда работает в своём процессе, где кеш ответов пуст.
+        response_cache.cache.clear()
+        output = StringIO()
+        call_command('response_cache_stats', stdout=output)
+        self.assertIn('RecipeViewSet.list: 1 hits, 1 misses',
+                      output.getvalue())
+
+    def test_authorized_flags(self):
+        response = self.authorized.get('/api/recipes/', {'limit': 100})
+        for recipe in response.data['results']:
+            number = int(recipe['name'].split()[-1])
+            self.assertEqual(recipe['is_favorited'], bool(number % 2))
+            self.assertEqual(recipe['is_in_shopping_cart'],
+                             number % 3 == 0)
+            self.assertEqual(recipe['author']['is_subscribed'],
+                             number % 3 == 0)
+
+    def test_loaddata_keeps_counters(self):
+        # Фикстура содержит и рецепт со счётчиком, и избранное.
+        favorite = Favorite.objects.select_related('recipe').first()
+        recipe = favorite.recipe
+        fixture = serializers.serialize('json', [recipe, favorite])
+        favorite.delete()
+        for obj in serializers.deserialize('json', fixture):
+            obj.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+
+    def test_rebuild_shopping_totals(self):
+        items = ShoppingListItem.objects.filter(user=self.user)
+        expected = dict(items.values_list('ingredient_id', 'total_amount'))
+        first, second = items[:2]
+        first.total_amount += 1
+        first.save()
+        second.delete()
+        author = User.objects.get(username='author1')
+        ShoppingListItem.objects.create(user=author,
+                                        ingredient=first.ingredient,
+                                        total_amount=1)
+        out = StringIO()
+        call_command('rebuild_shopping_totals', stdout=out)
+        self.assertIn('1 missing, 1 extra, 1 mismatched', out.getvalue())
+        self.assertEqual(
+            dict(items.values_list('ingredient_id', 'total_amount')),
+            expected,
+        )
+        self.assertEqual(ShoppingListItem.objects.count(), len(expected))
+
+    def test_catalog_seq_saved_with_update_fields(self):
+        ingredient = Ingredient.objects.first()
+        seq = ingredient.seq
+        ingredient.name = 'Новое название'
+        ingredient.save(update_fields=['name'])
+        ingredient.refresh_from_db()
+        self.assertGreater(ingredient.seq, seq)
+
+    @override_settings(FEED_FANOUT_ASYNC=False)
+    def test_fan_out_after_commit(self):
+        author = User.objects.get(username='author0')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            recipe = Recipe.objects.create(author=author, name='Новый',
+                                           text='Описание', cooking_time=5)
+            self.assertFalse(FeedItem.objects.filter(recipe=recipe).exists())
+        self.assertTrue(callbacks)
+        self.assertEqual(
+            list(FeedItem.objects.filter(recipe=recipe)
+                 .values_list('user_id', flat=True)),
+            [self.user.pk],
+        )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class RecipeCacheTest(SimpleTestCase):
+    """Тела рецептов в кеше не переживают изменения рецепта."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_body_built_before_invalidation_is_not_served(self):
+        def build_and_change(recipe_ids):
+            # Рецепт изменился, пока собиралось старое тело.
+            recipe_cache.invalidate(recipe_ids)
+            return {recipe_id: 'old' for recipe_id in recipe_ids}
+
+        recipe_cache.get_bodies([1], build_and_change)
+        bodies = recipe_cache.get_bodies(
+            [1], lambda recipe_ids: dict.fromkeys(recipe_ids, 'new')
+        )
+        self.assertEqual(bodies, {1: 'new'})
+
+    def test_body_survives_without_changes(self):
+        recipe_cache.get_bodies([1], lambda ids: dict.fromkeys(ids, 'body'))
+        bodies = recipe_cache.get_bodies([1], lambda ids: self.fail())
+        self.assertEqual(bodies, {1: 'body'})
+
+    def test_reset_version_does_not_match_old_bodies(self):
+        recipe_cache.get_bodies([1], lambda ids: dict.fromkeys(ids, 'old'))
+        cache.delete(recipe_cache.VERSION_KEY)
+        bodies = recipe_cache.get_bodies(
+            [1], lambda ids: dict.fromkeys(ids, 'new')
+        )
+        self.assertEqual(bodies, {1: 'new'})
@@ -1,17 +1,17 @@
-from api.views import (CustomUserViewSet, IngredientViewSet, RecipeViewSet,
-                       TagViewSet)
-from django.urls import include, path
-from rest_framework.routers import DefaultRouter
-
-app_name = 'api'
-
-router = DefaultRouter()
-router.register('ingredients', IngredientViewSet)
-router.register('tags', TagViewSet)
-router.register('recipes', RecipeViewSet)
-router.register('users', CustomUserViewSet)
-
-urlpatterns = [
-    path('', include(router.urls)),
-    path('auth/', include('djoser.urls.authtoken')),
-]
+from api.views import (CustomUserViewSet, IngredientViewSet, RecipeViewSet,
+                       TagViewSet)
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+
+app_name = 'api'
+
+router = DefaultRouter()
+router.register('ingredients', IngredientViewSet)
+router.register('tags', TagViewSet)
+router.register('recipes', RecipeViewSet)
+router.register('users', CustomUserViewSet)
+
+urlpatterns = [
+    path('', include(router.urls)),
+    path('auth/', include('djoser.urls.authtoken')),
+]
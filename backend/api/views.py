@@ -1,21 +1,33 @@
-from api.paginations import RecipePagination
+from api.catalog import CatalogSyncMixin
+from api.conditional import ConditionalGetMixin
+from api.middleware import query_budget
+from api.paginations import (FeedPagination, PantryPagination,
+                             RecipePagination)
 from api.permissions import IsAuthorOrReadOnly
-from api.serializers import (IngredientSerializer, RecipeCreateSerializer,
-                             RecipeReadSerializer,
-                             RecipeShopSerializer, SubscribeSerializer,
-                             TagSerializer,
-                             UserReadSerializer)
-from foodgram.settings import FILE_NAME, CONTENT_TYPE
-from django.db.models import Sum
-from django.http import HttpResponse
+from api.serializers import (IngredientSerializer, PantrySerializer,
+                             RecipeCreateSerializer, RecipeReadSerializer,
+                             RecipeShopSerializer, SimilarRecipeSerializer,
+                             SubscribeSerializer, TagSerializer,
+                             UserReadSerializer, get_recipes_limit)
+from api.renderers import (CSVRenderer, PDFRenderer, PlainTextRenderer,
+                           ShoppingCartNegotiation)
+from api.response_cache import ResponseCacheMixin
+from foodgram.settings import (FILE_NAME, RECIPE_IMAGE_FORMATS,
+                               RECIPE_IMAGE_SIZES, SHOPPING_CART_CHUNK_SIZE)
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Prefetch, Value
+from django.http import HttpResponseRedirect, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from recipes.models import (Favorite, Ingredient, IngredientAmount, Recipe,
-                            ShoppingCart, Tag)
+from recipes import thumbnails, versions
+from recipes.models import (CatalogSequence, Favorite, FeedItem, Ingredient,
+                            IngredientAmount, Recipe, ShoppingCart,
+                            ShoppingListItem, SimilarRecipe, Tag)
+from recipes.pantry_index import pantry_index
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.filters import SearchFilter
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.permissions import (SAFE_METHODS, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
@@ -30,15 +42,19 @@ class CustomUserViewSet(UserViewSet):
     queryset = User.objects.all()
     permission_classes = [IsAuthenticatedOrReadOnly, ]
     pagination_class = RecipePagination
+    keyset_ordering = ('id',)
+    query_budgets = {'list': 4, 'retrieve': 3, 'me': 2}
 
     @action(detail=False, methods=('get',),
             pagination_class=None,
             permission_classes=(IsAuthenticated,))
     def me(self, request):
-        serializer = UserReadSerializer(request.user)
+        serializer = UserReadSerializer(request.user,
+                                        context={'request': request})
         return Response(serializer.data,
                         status=status.HTTP_200_OK)
 
+    @query_budget(10)
     @action(
         methods=('POST', 'DELETE',),
         detail=True,
@@ -60,7 +76,9 @@ class CustomUserViewSet(UserViewSet):
                                  'Вы уже подписаны на этого пользователя!'},
                                 status=status.HTTP_400_BAD_REQUEST)
 
-            Subscribe.objects.create(user=user, author=author)
+            with transaction.atomic():
+                Subscribe.objects.create(user=user, author=author)
+                FeedItem.objects.backfill(user, author)
             serializer = SubscribeSerializer(author,
                                              context={'request': request})
 
@@ -68,7 +86,9 @@ class CustomUserViewSet(UserViewSet):
         elif request.method == 'DELETE':
             subscription = Subscribe.objects.filter(user=user, author=author)
             if subscription.exists():
-                subscription.delete()
+                with transaction.atomic():
+                    subscription.delete()
+                    FeedItem.objects.prune(user, author)
                 return Response(
                     {'message': 'Вы больше не подписаны на пользователя'},
                     status=status.HTTP_204_NO_CONTENT)
@@ -79,13 +99,27 @@ class CustomUserViewSet(UserViewSet):
         return Response({'errors': 'Неподдерживаемый метод запроса'},
                         status=status.HTTP_400_BAD_REQUEST)
 
+    @query_budget(4)
     @action(
         detail=False,
         permission_classes=[IsAuthenticated, ],
         url_path='subscriptions'
     )
     def subscriptions(self, request):
-        queryset = User.objects.filter(subscribing__user=request.user)
+        recipes = Recipe.objects.defer('search_vector').order_by(
+            '-pub_date', '-id'
+        )
+        recipes_limit = get_recipes_limit(request)
+        if recipes_limit is not None:
+            recipes = recipes[:recipes_limit]
+        queryset = User.objects.filter(
+            subscribing__user=request.user
+        ).annotate(
+            recipes_count=Count('author', distinct=True),
+            is_subscribed=Value(True),
+        ).order_by('id').prefetch_related(
+            Prefetch('author', queryset=recipes, to_attr='limited_recipes')
+        )
         pag_queryset = self.paginate_queryset(queryset)
         serializer = SubscribeSerializer(pag_queryset,
                                          many=True,
@@ -93,22 +127,37 @@ class CustomUserViewSet(UserViewSet):
         return self.get_paginated_response(serializer.data)
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
-    """Вьюсет для просмотра ингредиентов."""
+class IngredientViewSet(ConditionalGetMixin, CatalogSyncMixin,
+                        ReadOnlyModelViewSet):
+    """
+    Вьюсет для просмотра ингредиентов.
+    Клиент может хранить справочник у себя и догружать
+    только изменения: ?since=<seq>.
+    """
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = (SearchFilter,)
-    filterset_class = IngredientFilter
-    search_fields = ('^name',)
+    filter_backends = (IngredientFilter,)
+    query_budgets = {'list': 4, 'retrieve': 2, 'snapshot': 3}
+
+    def get_etag_data(self, request):
+        """Справочник меняется вместе с номером в базе."""
+        return CatalogSequence.objects.current()
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(ConditionalGetMixin, CatalogSyncMixin,
+                 ReadOnlyModelViewSet):
     """Вьюсет для просмотра тегов."""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    query_budgets = {'list': 4, 'retrieve': 2, 'snapshot': 3}
 
+    def get_etag_data(self, request):
+        """Справочник меняется вместе с номером в базе."""
+        return CatalogSequence.objects.current()
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(ConditionalGetMixin, ResponseCacheMixin,
+                    viewsets.ModelViewSet):
     """Вьюсет рецепта.
        Просмотр, создание, редактирование."""
     queryset = Recipe.objects.all()
@@ -117,6 +166,34 @@ class RecipeViewSet(viewsets.ModelViewSet):
     pagination_class = RecipePagination
     filterset_class = RecipeFilter
     filter_backends = (DjangoFilterBackend,)
+    parser_classes = (JSONParser, MultiPartParser)
+    etag_versions = (versions.RECIPES,)
+    etag_per_user = True
+    query_budgets = {'list': 8, 'retrieve': 6}
+
+    def get_etag_versions(self, request):
+        """Порядок popular меняется с каждым добавлением в избранное."""
+        names = super().get_etag_versions(request)
+        if 'ordering' in request.query_params:
+            names.append(versions.POPULARITY)
+        return names
+
+    def get_queryset(self):
+        """
+        Рецепты с флагами текущего пользователя.
+        Связанные данные загружаются только для рецептов,
+        которых нет в кеше (см. RecipeReadSerializer).
+        """
+        queryset = Recipe.objects.defer('search_vector')
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_favorited=Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+            )
+        return queryset
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -126,6 +203,111 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeReadSerializer
         return RecipeCreateSerializer
 
+    @query_budget(8)
+    @action(
+        detail=False,
+        methods=('get',),
+        permission_classes=(IsAuthenticated,),
+        pagination_class=FeedPagination)
+    def feed(self, request):
+        """
+        Последние рецепты авторов, на которых подписан пользователь.
+        Читается из ленты, заполненной при публикации рецептов.
+        """
+        feed_items = self.paginate_queryset(
+            FeedItem.objects.filter(user=request.user)
+            .only('id', 'recipe_id', 'pub_date')
+            .order_by('-pub_date', '-id')
+        )
+        recipes = self.get_queryset().in_bulk(
+            [item.recipe_id for item in feed_items]
+        )
+        serializer = RecipeReadSerializer(
+            [recipes[item.recipe_id] for item in feed_items
+             if item.recipe_id in recipes],
+            many=True,
+            context=self.get_serializer_context(),
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @query_budget(7)
+    @action(
+        detail=False,
+        methods=('get',),
+        pagination_class=PantryPagination)
+    def pantry(self, request):
+        """
+        Что можно приготовить из продуктов ?ingredients=1&ingredients=2.
+        Сначала рецепты, для которых есть всё, затем с одним
+        недостающим ингредиентом и так далее.
+        """
+        params = PantrySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        matches = self.paginate_queryset(pantry_index.match(
+            params.validated_data['ingredients'],
+            params.validated_data.get('max_missing'),
+        ))
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _ in matches]
+        )
+        matches = [(recipes[recipe_id], missing)
+                   for recipe_id, missing in matches
+                   if recipe_id in recipes]
+        serializer = RecipeReadSerializer(
+            [recipe for recipe, _ in matches],
+            many=True,
+            context=self.get_serializer_context(),
+        )
+        data = serializer.data
+        for item, (_, missing) in zip(data, matches):
+            item['missing_ingredients'] = missing
+        return self.get_paginated_response(data)
+
+    @action(
+        detail=True,
+        methods=('get',),
+        pagination_class=None)
+    def image(self, request, **kwargs):
+        """
+        Уменьшенная копия изображения ?size=480&ext=webp.
+        Строится при первом запросе, дальше отдаётся редирект
+        на готовый файл.
+        """
+        recipe = get_object_or_404(
+            Recipe.objects.only('id', 'image'), id=kwargs.get('pk')
+        )
+        size = request.query_params.get('size')
+        extension = request.query_params.get('ext')
+        if (not recipe.image
+                or size not in map(str, RECIPE_IMAGE_SIZES)
+                or extension not in RECIPE_IMAGE_FORMATS):
+            return Response({'errors': 'Нет такой копии изображения.'},
+                            status=status.HTTP_404_NOT_FOUND)
+        derivative = thumbnails.get_derivative(recipe.image, size, extension)
+        return HttpResponseRedirect(
+            request.build_absolute_uri(derivative.url)
+        )
+
+    @query_budget(3)
+    @action(
+        detail=True,
+        methods=('get',),
+        pagination_class=None)
+    def similar(self, request, **kwargs):
+        """Похожие по составу рецепты, посчитанные заранее."""
+        recipe = get_object_or_404(Recipe, id=kwargs.get('pk'))
+        similar = SimilarRecipe.objects.filter(
+            recipe=recipe
+        ).select_related('similar').only(
+            'score', 'similar__id', 'similar__name', 'similar__image',
+            'similar__image_derivatives', 'similar__cooking_time',
+        )
+        serializer = SimilarRecipeSerializer(
+            similar, many=True, context={'request': request}
+        )
+        return Response(serializer.data)
+
+    @query_budget(6)
     @action(
         detail=True,
         methods=['post', 'delete'],
@@ -142,7 +324,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
             if not Favorite.objects.filter(
                 user=request.user, recipe=recipe
             ).exists():
-                Favorite.objects.create(user=request.user, recipe=recipe)
+                # Счётчик рецепта обновляет сигнал в этой же транзакции.
+                with transaction.atomic():
+                    Favorite.objects.create(user=request.user, recipe=recipe)
                 return Response(
                     serializer.data,
                     status=status.HTTP_201_CREATED
@@ -153,14 +337,17 @@ class RecipeViewSet(viewsets.ModelViewSet):
             )
 
         if request.method == 'DELETE':
-            get_object_or_404(
+            favorite = get_object_or_404(
                 Favorite, user=request.user, recipe=recipe
-            ).delete()
+            )
+            with transaction.atomic():
+                favorite.delete()
             return Response(
                 {'detail': 'Рецепт успешно удален из избранного.'},
                 status=status.HTTP_204_NO_CONTENT,
             )
 
+    @query_budget(10)
     @action(
         detail=True,
         methods=['POST', 'DELETE'],
@@ -177,7 +364,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
             serializer.is_valid(raise_exception=True)
             if not ShoppingCart.objects.filter(user=user,
                                                recipe=recipe).exists():
-                ShoppingCart.objects.create(user=user, recipe=recipe)
+                # Итоги списка покупок пишет сигнал в этой же транзакции.
+                with transaction.atomic():
+                    ShoppingCart.objects.create(user=user, recipe=recipe)
                 return Response(serializer.data,
                                 status=status.HTTP_201_CREATED)
             return Response(
@@ -194,7 +383,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        shopping_cart.delete()
+        with transaction.atomic():
+            shopping_cart.delete()
         return Response(
             {'detail': 'Рецепт удален из корзины'},
             status=status.HTTP_204_NO_CONTENT
@@ -203,28 +393,35 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @action(
         detail=False,
         methods=['get'],
-        permission_classes=(IsAuthenticated,))
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(PlainTextRenderer, CSVRenderer, PDFRenderer),
+        content_negotiation_class=ShoppingCartNegotiation)
     def download_shopping_cart(self, request, **kwargs):
-        ingredients = (
-            IngredientAmount.objects.filter(
-
+        """
+        Список покупок текущего пользователя.
+        Формат выбирается параметром ?format=txt|csv|pdf,
+        по умолчанию - текст. Текст и CSV отдаются по мере чтения
+        курсора, PDF - одним блоком.
+        """
+        rows = (
+            ShoppingListItem.objects.filter(user=request.user)
+            .values_list(
+                'ingredient__name',
+                'ingredient__measurement_unit',
+                'total_amount',
             )
-            .values('ingredient__name', 'ingredient__measurement_unit')
-            .annotate(total_amount=Sum('amount'))
+            .order_by('ingredient__name')
+            .iterator(chunk_size=SHOPPING_CART_CHUNK_SIZE)
         )
-
-        file_contents = [
-            f'{ingredient["ingredient__name"]} - {ingredient["total_amount"]}'
-            f'{ingredient["ingredient__measurement_unit"]}.'
-            for ingredient in ingredients
-        ]
-
-        file_content = "\n".join(file_contents)
-        file = HttpResponse(
-            "Список покупок:\n" + file_content,
-            content_type=CONTENT_TYPE
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        file = StreamingHttpResponse(
+            renderer.stream(rows),
+            content_type=content_type
+        )
+        file['Content-Disposition'] = (
+            f'attachment; filename={FILE_NAME}.{renderer.format}'
         )
-        file["Content-Disposition"] = f"attachment; \
-            filename={FILE_NAME}"
-
         return file
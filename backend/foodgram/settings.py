@@ -26,12 +26,14 @@ INSTALLED_APPS = [
     'import_export',
     'djoser',
     'colorfield',
+    'sorl.thumbnail',
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
 ]
 
 MIDDLEWARE = [
+    'api.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -63,7 +65,9 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # Тесты можно запускать на SQLite:
+        # DB_ENGINE=django.db.backends.sqlite3 python manage.py test
+        'ENGINE': os.getenv('DB_ENGINE', 'django.db.backends.postgresql'),
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
@@ -111,13 +115,44 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Загружаемые файлы сразу пишутся на диск, а не в память воркера.
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Кеш по умолчанию должен быть общим для всех процессов: в нём лежат
+# версии данных и токены, а load_ingredients и воркеры gunicorn -
+# разные процессы. LocMemCache подходит только для разработки.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', '/var/tmp/foodgram_cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 100000)),
+        },
+    },
+    # Готовые ответы для анонимных пользователей. Подходят LocMemCache,
+    # FileBasedCache (LOCATION - каталог) и DatabaseCache (LOCATION -
+    # таблица, создаётся командой createcachetable).
+    'responses': {
+        'BACKEND': os.getenv(
+            'RESPONSE_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('RESPONSE_CACHE_LOCATION', 'foodgram-responses'),
+    },
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ),
     'SEARCH_PARAM': 'name',
 }
@@ -146,5 +181,55 @@ MAX_INGREDIENT_AMOUNT = 100
 DEFAULT_INGREDIENT_AMOUNT = 1
 MIN_AMOUNT_MODEL = 1
 MIN_TIME_MODEL = 1
-FILE_NAME = 'shopping_cart.txt'
-CONTENT_TYPE = 'text/plain'
+INGREDIENT_SEARCH_LIMIT = 50
+TOKEN_CACHE_TTL = 300
+TOKEN_CACHE_LOCAL_TTL = 30
+TOKEN_CACHE_LOCAL_SIZE = 10000
+RECIPE_CACHE_TTL = 60 * 60
+FILE_NAME = 'shopping_cart'
+SHOPPING_CART_CHUNK_SIZE = 2000
+FEED_FANOUT_BATCH_SIZE = 1000
+FEED_FANOUT_ASYNC = True
+FEED_BACKFILL_LIMIT = 100
+RECIPE_SEARCH_CONFIG = 'russian'
+PANTRY_INDEX_MAX_CHANGES = 1000
+PANTRY_INDEX_CHANGES_TTL = 24 * 60 * 60
+PANTRY_MAX_INGREDIENTS = 100
+RECIPE_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+RECIPE_IMAGE_SIZES = (160, 480, 1024)
+RECIPE_IMAGE_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+RECIPE_IMAGE_DERIVATIVES_ASYNC = True
+THUMBNAIL_PREFIX = 'recipes/thumbnails/'
+THUMBNAIL_QUALITY = 85
+CATALOG_SNAPSHOT_TTL = 24 * 60 * 60
+RESPONSE_CACHE_TTL = 10 * 60
+RESPONSE_CACHE_LOCK_TIMEOUT = 10
+RESPONSE_CACHE_WAIT_INTERVAL = 0.05
+SQL_INSTRUMENTATION = os.getenv(
+    'SQL_INSTRUMENTATION', 'True'
+).lower() == 'true'
+# Превышение бюджета запросов - ошибка, а не предупреждение.
+QUERY_BUDGET_ENFORCE = os.getenv(
+    'QUERY_BUDGET_ENFORCE', str(DEBUG)
+).lower() == 'true'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # DEBUG - строка с числом запросов на каждый запрос,
+        # WARNING и выше - только превышения бюджета.
+        'api.middleware': {
+            'handlers': ['console'],
+            'level': os.getenv('SQL_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
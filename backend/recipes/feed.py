@@ -0,0 +1,42 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from recipes.models import FeedItem, Recipe
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(max_workers=1,
+                              thread_name_prefix='recipe-feed')
+
+
+def fan_out_in_background(recipe_id):
+    close_old_connections()
+    try:
+        recipe = Recipe.objects.only(
+            'id', 'author_id', 'pub_date'
+        ).filter(pk=recipe_id).first()
+        if recipe is not None:
+            FeedItem.objects.fan_out(recipe)
+    except Exception:
+        logger.exception('Не удалось разложить рецепт %s по лентам',
+                         recipe_id)
+    finally:
+        close_old_connections()
+
+
+def schedule(recipe):
+    """
+    Раскладывает рецепт по лентам подписчиков в фоновом потоке
+    после коммита: у автора с большим числом подписчиков запрос
+    на создание рецепта не ждёт записи всех лент.
+    С FEED_FANOUT_ASYNC = False раскладка идёт сразу после коммита
+    в том же потоке.
+    """
+    recipe_id = recipe.pk
+    if settings.FEED_FANOUT_ASYNC:
+        transaction.on_commit(lambda: executor.submit(fan_out_in_background,
+                                                      recipe_id))
+    else:
+        transaction.on_commit(lambda: fan_out_in_background(recipe_id))
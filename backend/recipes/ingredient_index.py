@@ -0,0 +1,61 @@
+import threading
+from bisect import bisect_left
+
+from foodgram.settings import INGREDIENT_SEARCH_LIMIT
+from recipes.models import CatalogSequence, Ingredient
+
+
+class IngredientIndex:
+    """
+    Индекс ингредиентов в памяти процесса для поиска по началу названия.
+    Версия - номер изменения справочника из базы (CatalogSequence):
+    после изменения ингредиентов в любом процессе, в том числе
+    в load_ingredients, индекс перечитывается при следующем запросе.
+    """
+
+    def __init__(self):
+        # Ключи и ингредиенты заменяются одним присваиванием,
+        # поэтому search() без блокировки видит согласованную пару.
+        self._index = ([], [])
+        self._version = None
+        self._lock = threading.Lock()
+
+    def current_version(self):
+        return CatalogSequence.objects.current()
+
+    def load(self, version):
+        items = sorted(
+            Ingredient.objects.only('id', 'name', 'measurement_unit'),
+            key=lambda item: (item.name.lower(), item.name,
+                              item.measurement_unit, item.id)
+        )
+        self._index = ([item.name.lower() for item in items], items)
+        self._version = version
+
+    def ensure_loaded(self):
+        version = self.current_version()
+        if version == self._version:
+            return
+        with self._lock:
+            if version != self._version:
+                self.load(version)
+
+    def search(self, prefix, limit=INGREDIENT_SEARCH_LIMIT):
+        """
+        Ингредиенты, название которых начинается с prefix.
+        Точные совпадения идут первыми: в отсортированном массиве
+        строка стоит раньше всех своих продолжений.
+        """
+        self.ensure_loaded()
+        prefix = prefix.lower()
+        keys, items = self._index
+        start = bisect_left(keys, prefix)
+        result = []
+        for index in range(start, len(keys)):
+            if len(result) >= limit or not keys[index].startswith(prefix):
+                break
+            result.append(items[index])
+        return result
+
+
+ingredient_index = IngredientIndex()
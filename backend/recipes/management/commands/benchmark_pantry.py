@@ -0,0 +1,67 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from recipes.pantry_index import PantryIndex
+
+MSG_BUILD = ('Index built: {recipes} recipes, {rows} rows '
+             'in {seconds:.2f}s.')
+MSG_LATENCY = ('{queries} queries, pantry of {pantry}: '
+               'p50 {p50:.2f}ms, p95 {p95:.2f}ms, p99 {p99:.2f}ms, '
+               'max {max:.2f}ms, {matches:.0f} matches on average.')
+
+
+class Command(BaseCommand):
+    help = ("This command measures pantry matching latency "
+            "on a synthetic catalog without touching the database")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--per-recipe', dest='per_recipe', type=int,
+                            default=8)
+        parser.add_argument('--pantry', type=int, default=20)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def synthetic_rows(self, options, rng):
+        # Популярность ингредиентов неравномерна, как в реальном каталоге.
+        weights = [1 / (rank + 1) for rank in range(options['ingredients'])]
+        ingredient_ids = range(1, options['ingredients'] + 1)
+        for recipe_id in range(1, options['recipes'] + 1):
+            for ingredient_id in set(rng.choices(
+                ingredient_ids, weights, k=options['per_recipe']
+            )):
+                yield recipe_id, ingredient_id
+
+    def percentile(self, values, share):
+        return values[min(int(len(values) * share), len(values) - 1)]
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        index = PantryIndex()
+        rows = list(self.synthetic_rows(options, rng))
+        started = time.perf_counter()
+        index.build(rows)
+        self.stdout.write(MSG_BUILD.format(
+            recipes=options['recipes'],
+            rows=len(rows),
+            seconds=time.perf_counter() - started,
+        ))
+        ingredient_ids = range(1, options['ingredients'] + 1)
+        timings, matches = [], 0
+        for _ in range(options['queries']):
+            pantry = rng.sample(ingredient_ids, options['pantry'])
+            started = time.perf_counter()
+            matches += len(index.rank(pantry))
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        self.stdout.write(self.style.SUCCESS(MSG_LATENCY.format(
+            queries=len(timings),
+            pantry=options['pantry'],
+            p50=self.percentile(timings, 0.5),
+            p95=self.percentile(timings, 0.95),
+            p99=self.percentile(timings, 0.99),
+            max=timings[-1],
+            matches=matches / len(timings),
+        )))
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from recipes import thumbnails
+from recipes.models import Recipe
+
+MSG_PROGRESS = '{done} recipes processed.'
+MSG_FAILED = 'Recipe {recipe_id}: {error}'
+MSG_DONE = ('Image derivatives built for {count} recipes '
+            'in {seconds:.2f}s, {failed} failed.')
+
+
+class Command(BaseCommand):
+    help = ("This command builds resized copies of recipe images "
+            "that do not have them yet")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='rebuild derivatives for all recipes.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        recipes = Recipe.objects.only(
+            'id', 'image', 'image_derivatives'
+        ).exclude(image='').order_by('id')
+        count = failed = 0
+        for recipe in recipes.iterator(chunk_size=500):
+            if not options['force'] and thumbnails.is_ready(recipe):
+                continue
+            try:
+                thumbnails.build_derivatives(recipe)
+            except Exception as error:
+                failed += 1
+                self.stderr.write(MSG_FAILED.format(recipe_id=recipe.id,
+                                                    error=error))
+                continue
+            count += 1
+            if count % 100 == 0:
+                self.stdout.write(MSG_PROGRESS.format(done=count))
+        self.stdout.write(self.style.SUCCESS(MSG_DONE.format(
+            count=count,
+            seconds=time.monotonic() - started,
+            failed=failed,
+        )))
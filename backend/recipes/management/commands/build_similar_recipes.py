@@ -0,0 +1,182 @@
+import heapq
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.models import IngredientAmount, Recipe, SimilarRecipe
+from scipy import sparse
+
+DEFAULT_TOP_K = 10
+DEFAULT_CHUNK_SIZE = 1000
+# Строк матрицы в одном произведении: для рецептов с частыми
+# ингредиентами строка результата почти плотная.
+DEFAULT_BLOCK_SIZE = 100
+
+MSG_NOTHING = 'No recipes to update.'
+MSG_PROGRESS = '{done}/{total} recipes processed.'
+MSG_DONE = 'Similar recipes built for {count} recipes in {seconds:.2f}s.'
+
+
+class Command(BaseCommand):
+    help = ("This command computes top-K similar recipes by Jaccard "
+            "overlap of their ingredients")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true',
+                            help='only recipes changed since the last run.')
+        parser.add_argument('--top-k', dest='top_k', type=int,
+                            default=DEFAULT_TOP_K,
+                            help='neighbours stored per recipe.')
+        parser.add_argument('--chunk-size', dest='chunk_size', type=int,
+                            default=DEFAULT_CHUNK_SIZE,
+                            help='recipes per transaction.')
+        parser.add_argument('--block-size', dest='block_size', type=int,
+                            default=DEFAULT_BLOCK_SIZE,
+                            help='recipes per sparse matrix product.')
+
+    def build_matrix(self, pairs):
+        """
+        Разреженная матрица рецепт × ингредиент из единиц
+        по парам (id рецепта, id ингредиента).
+        """
+        pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+        self.recipe_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+        _, columns = np.unique(pairs[:, 1], return_inverse=True)
+        self.positions = {
+            recipe_id: position
+            for position, recipe_id in enumerate(self.recipe_ids.tolist())
+        }
+        matrix = sparse.csr_matrix(
+            (np.ones(len(pairs), dtype=np.int32), (rows, columns)),
+            shape=(len(self.recipe_ids), columns.max(initial=-1) + 1),
+        )
+        matrix.sum_duplicates()
+        matrix.data[:] = 1
+        self.matrix = matrix
+        self.matrix_t = matrix.T.tocsc()
+        self.sizes = np.diff(matrix.indptr)
+
+    def load_matrix(self):
+        self.build_matrix(list(
+            IngredientAmount.objects.values_list('recipe_id', 'ingredient_id')
+            .order_by().iterator(chunk_size=10000)
+        ))
+
+    def block_scores(self, recipe_ids):
+        """
+        Сходство рецептов блока со всеми рецептами, у которых есть
+        общие ингредиенты: |A ∩ B| / |A ∪ B|. Число общих ингредиентов
+        для всего блока - одно произведение X[блок] · Xᵀ.
+        Возвращает {id: (сходство, id рецептов)} в массивах.
+        """
+        rows = [self.positions[recipe_id] for recipe_id in recipe_ids
+                if recipe_id in self.positions]
+        result = {recipe_id: (np.empty(0), np.empty(0, dtype=np.int64))
+                  for recipe_id in recipe_ids}
+        if not rows:
+            return result
+        common = (self.matrix[rows] @ self.matrix_t).tocsr()
+        for number, row in enumerate(rows):
+            start, end = common.indptr[number], common.indptr[number + 1]
+            others = common.indices[start:end]
+            shared = common.data[start:end]
+            keep = others != row
+            others, shared = others[keep], shared[keep]
+            scores = shared / (self.sizes[row] + self.sizes[others] - shared)
+            result[int(self.recipe_ids[row])] = (scores,
+                                                 self.recipe_ids[others])
+        return result
+
+    def top(self, scores):
+        return heapq.nlargest(self.top_k, scores)
+
+    def top_array(self, scores, other_ids):
+        """top() для массивов: при равном сходстве - больший id."""
+        if len(scores) > self.top_k:
+            threshold = np.partition(scores, -self.top_k)[-self.top_k]
+            candidates = scores >= threshold
+            scores, other_ids = scores[candidates], other_ids[candidates]
+        order = np.lexsort((other_ids, scores))[::-1][:self.top_k]
+        return list(zip(scores[order].tolist(), other_ids[order].tolist()))
+
+    def replace(self, neighbours):
+        SimilarRecipe.objects.filter(recipe_id__in=neighbours).delete()
+        SimilarRecipe.objects.bulk_create(
+            SimilarRecipe(recipe_id=recipe_id, similar_id=similar_id,
+                          score=score)
+            for recipe_id, top in neighbours.items()
+            for score, similar_id in top
+        )
+
+    def merge(self, chunk, reverse_scores):
+        """
+        Обновляет списки остальных рецептов: убирает из них рецепты
+        чанка со старым сходством и добавляет новое.
+        Вытесненный из топа рецепт не возвращается до полного пересчёта.
+        """
+        affected = set(reverse_scores) | set(
+            SimilarRecipe.objects.filter(similar_id__in=chunk)
+            .values_list('recipe_id', flat=True)
+        )
+        affected -= self.targets
+        if not affected:
+            return {}
+        current = {recipe_id: [] for recipe_id in affected}
+        for recipe_id, similar_id, score in SimilarRecipe.objects.filter(
+            recipe_id__in=affected
+        ).values_list('recipe_id', 'similar_id', 'score'):
+            if similar_id not in chunk:
+                current[recipe_id].append((score, similar_id))
+        return {
+            recipe_id: self.top(
+                scores + reverse_scores.get(recipe_id, [])
+            )
+            for recipe_id, scores in current.items()
+        }
+
+    def handle(self, *args, **options):
+        self.top_k = max(options['top_k'], 1)
+        chunk_size = max(options['chunk_size'], 1)
+        started = time.monotonic()
+        recipes = Recipe.objects.order_by('id')
+        if options['incremental']:
+            recipes = recipes.filter(similar_stale=True)
+        targets = list(recipes.values_list('id', flat=True))
+        if not targets:
+            self.stdout.write(self.style.NOTICE(MSG_NOTHING))
+            return
+        self.targets = set(targets)
+        chunks = [targets[start:start + chunk_size]
+                  for start in range(0, len(targets), chunk_size)]
+        # Флаг снимается до чтения состава: изменения во время
+        # пересчёта попадут в следующий запуск.
+        for chunk in chunks:
+            Recipe.objects.filter(pk__in=chunk).update(similar_stale=False)
+        self.load_matrix()
+        block_size = max(options['block_size'], 1)
+        done = 0
+        for chunk in chunks:
+            neighbours, reverse_scores = {}, {}
+            for start in range(0, len(chunk), block_size):
+                block = self.block_scores(chunk[start:start + block_size])
+                for recipe_id, (scores, other_ids) in block.items():
+                    neighbours[recipe_id] = self.top_array(scores,
+                                                           other_ids)
+                    if options['incremental']:
+                        for score, other_id in zip(scores.tolist(),
+                                                   other_ids.tolist()):
+                            reverse_scores.setdefault(other_id, []).append(
+                                (score, recipe_id)
+                            )
+            with transaction.atomic():
+                if options['incremental']:
+                    neighbours.update(self.merge(set(chunk), reverse_scores))
+                self.replace(neighbours)
+            done += len(chunk)
+            self.stdout.write(MSG_PROGRESS.format(done=done,
+                                                  total=len(targets)))
+        self.stdout.write(self.style.SUCCESS(MSG_DONE.format(
+            count=len(targets),
+            seconds=time.monotonic() - started,
+        )))
@@ -0,0 +1,98 @@
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+from recipes.models import Recipe
+from sorl.thumbnail import delete as delete_with_thumbnails
+from sorl.thumbnail.images import ImageFile
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_MIN_AGE = 3600
+
+MSG_PROGRESS = '{scanned} files scanned, {deleted} orphaned.'
+MSG_DONE = ('{scanned} files scanned, {shared} shared by several recipes, '
+            '{deleted} orphaned ({size} bytes) in {seconds:.2f}s.')
+MSG_DRY_RUN = 'Dry run: nothing was deleted.'
+
+
+class Command(BaseCommand):
+    help = ("This command deletes recipe images that are not referenced "
+            "by any recipe, together with their resized copies")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', dest='batch_size',
+                            default=DEFAULT_BATCH_SIZE, type=int,
+                            help='files checked per query.')
+        parser.add_argument('--min-age', dest='min_age',
+                            default=DEFAULT_MIN_AGE, type=int,
+                            help='keep files younger than this, seconds.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='only report orphaned files.')
+
+    def walk(self, directory):
+        """Обходит хранилище, пропуская каталог миниатюр."""
+        directories, files = self.storage.listdir(directory)
+        for name in files:
+            yield os.path.join(directory, name)
+        for name in directories:
+            path = os.path.join(directory, name)
+            if path + '/' != settings.THUMBNAIL_PREFIX:
+                yield from self.walk(path)
+
+    def batches(self, names):
+        batch = []
+        for name in names:
+            batch.append(name)
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def collect(self, batch):
+        """Удаляет файлы пакета, на которые не ссылается ни один рецепт."""
+        references = dict(
+            Recipe.objects.filter(image__in=batch)
+            .values_list('image')
+            .annotate(references=Count('id'))
+            .order_by()
+        )
+        self.shared += sum(count > 1 for count in references.values())
+        for name in batch:
+            if name in references:
+                continue
+            if self.storage.get_modified_time(name) > self.threshold:
+                continue
+            self.deleted += 1
+            self.size += self.storage.size(name)
+            if not self.dry_run:
+                delete_with_thumbnails(ImageFile(name, self.storage))
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        self.batch_size = max(options['batch_size'], 1)
+        self.dry_run = options['dry_run']
+        self.threshold = timezone.now() - timedelta(seconds=options['min_age'])
+        field = Recipe._meta.get_field('image')
+        self.storage = field.storage
+        scanned = self.shared = self.deleted = self.size = 0
+        if self.storage.exists(field.upload_to):
+            names = self.walk(field.upload_to.rstrip('/'))
+            for batch in self.batches(names):
+                self.collect(batch)
+                scanned += len(batch)
+                self.stdout.write(MSG_PROGRESS.format(scanned=scanned,
+                                                      deleted=self.deleted))
+        self.stdout.write(self.style.SUCCESS(MSG_DONE.format(
+            scanned=scanned,
+            shared=self.shared,
+            deleted=self.deleted,
+            size=self.size,
+            seconds=time.monotonic() - started,
+        )))
+        if self.dry_run:
+            self.stdout.write(self.style.NOTICE(MSG_DRY_RUN))
@@ -1,61 +1,138 @@
 import csv
+import io
+import json
 import os
+import time
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
-from recipes.models import Ingredient
+from django.db import connection, transaction
+from recipes.models import CatalogSequence, Ingredient
 
 DEFAULT_IMPORT_FOLDER_NAME = 'data'
 DEFAULT_IMPORT_FILE_NAME = 'ingredients.csv'
 DEFAULT_IMPORT_FILE_PATH = os.path.join(
     settings.BASE_DIR, DEFAULT_IMPORT_FOLDER_NAME,
 )
+DEFAULT_BATCH_SIZE = 1000
 
 MSG_SUCCESSFUL = 'Import completed successfully!'
 MSG_UNSUCCESSFUL = 'Import failed...'
 MSG_NO_CHANGES = 'No changes detected.'
+MSG_PROGRESS = '{count} rows read ({rate:.0f} rows/s)'
+MSG_DRY_RUN = ('Dry run: {read} rows read, {unique} unique, '
+               '{new} would be added.')
+MSG_STATS = ('{read} rows read, {unique} unique in {seconds:.2f}s '
+             '({rate:.0f} rows/s).')
 
 ERR_FILE_NOT_EXISTS = (
     f"File with name '{DEFAULT_IMPORT_FILE_NAME}' "
     f"in folder '{DEFAULT_IMPORT_FOLDER_NAME}' is required!",
 )
 ERR_ARGS_FILE_NOT_EXISTS = ("There is no such file as '{}'")
+ERR_UNKNOWN_FORMAT = "Unsupported file format '{}': use .csv or .json"
+ERR_COPY_UNSUPPORTED = 'COPY is only available on PostgreSQL.'
+
+COPY_TEMP_TABLE = 'ingredient_import'
 
 
 class Command(BaseCommand):
     help = ("This command perform to import all ingredients data "
-            "from CSV file into database")
+            "from CSV or JSON file into database")
 
     def add_arguments(self, parser):
         parser.add_argument('-f', '--filename', dest='filename',
                             default=DEFAULT_IMPORT_FILE_NAME, nargs='?',
                             type=str, help='specify file name.')
+        parser.add_argument('--batch-size', dest='batch_size',
+                            default=DEFAULT_BATCH_SIZE, type=int,
+                            help='rows per INSERT statement.')
+        parser.add_argument('--copy', action='store_true',
+                            help='load through PostgreSQL COPY.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='parse the file without writing.')
+
+    def read_csv(self, file):
+        for row in csv.reader(file):
+            if row:
+                name, measurement_unit = row
+                yield name, measurement_unit
+
+    def read_json(self, file):
+        for item in json.load(file):
+            yield item['name'], item['measurement_unit']
+
+    def read_rows(self, file, extension):
+        readers = {'.csv': self.read_csv, '.json': self.read_json}
+        if extension not in readers:
+            raise CommandError(ERR_UNKNOWN_FORMAT.format(extension))
+        return readers[extension](file)
+
+    def unique_rows(self, rows, started):
+        """Убирает повторы и пустые значения, сообщая о прогрессе."""
+        seen = set()
+        self.count_read = 0
+        for name, measurement_unit in rows:
+            self.count_read += 1
+            if self.count_read % self.batch_size == 0:
+                self.stdout.write(MSG_PROGRESS.format(
+                    count=self.count_read,
+                    rate=self.count_read / (time.monotonic() - started),
+                ))
+            key = (name.strip(), measurement_unit.strip())
+            if all(key) and key not in seen:
+                seen.add(key)
+                yield key
+
+    def bulk_load(self, rows, seq):
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=name, measurement_unit=measurement_unit,
+                        seq=seq)
+             for name, measurement_unit in rows),
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+
+    def copy_load(self, rows, seq):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        table = Ingredient._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMP TABLE {COPY_TEMP_TABLE} '
+                f'(name varchar(200), measurement_unit varchar(200)) '
+                f'ON COMMIT DROP'
+            )
+            cursor.copy_expert(
+                f'COPY {COPY_TEMP_TABLE} (name, measurement_unit) '
+                f'FROM STDIN WITH (FORMAT csv)',
+                buffer,
+            )
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit, seq) '
+                f'SELECT name, measurement_unit, %s FROM {COPY_TEMP_TABLE} '
+                f'ON CONFLICT (name, measurement_unit) DO NOTHING',
+                [seq],
+            )
 
     def handle(self, *args, **options):
         PATH_TO_FILE = os.path.join(
             DEFAULT_IMPORT_FILE_PATH,
             options['filename'],
         )
-        count_rows = 0
+        extension = os.path.splitext(PATH_TO_FILE)[1].lower()
+        self.batch_size = max(options['batch_size'], 1)
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError(ERR_COPY_UNSUPPORTED)
+        started = time.monotonic()
         try:
             with open(file=PATH_TO_FILE,
                       mode='r',
                       encoding='utf-8') as file:
-                data = csv.reader(file)
-                for row in data:
-                    name, measurement_unit = row
-                    ingredient, created = Ingredient.objects.get_or_create(
-                        name=name, measurement_unit=measurement_unit,
-                    )
-                    if created:
-                        count_rows += 1
-            if count_rows == 0:
-                self.stdout.write(self.style.NOTICE(MSG_NO_CHANGES))
-            else:
-                self.stdout.write(self.style.SUCCESS(
-                    MSG_SUCCESSFUL + f' {count_rows} rows added.'
-                )
-                )
+                rows = list(self.unique_rows(
+                    self.read_rows(file, extension), started
+                ))
         except FileNotFoundError:
             self.stdout.write(self.style.ERROR(MSG_UNSUCCESSFUL))
             if options['filename']:
@@ -63,5 +140,41 @@ class Command(BaseCommand):
                     ERR_ARGS_FILE_NOT_EXISTS.format(options['filename'])
                 )
                 )
+                return
+            raise CommandError(ERR_FILE_NOT_EXISTS)
+
+        if options['dry_run']:
+            existing = set(
+                Ingredient.objects.values_list('name', 'measurement_unit')
+            )
+            self.stdout.write(self.style.NOTICE(MSG_DRY_RUN.format(
+                read=self.count_read,
+                unique=len(rows),
+                new=len(set(rows) - existing),
+            )))
+            return
+
+        with transaction.atomic():
+            count_before = Ingredient.objects.count()
+            # Все добавленные строки получают один номер изменения.
+            seq = CatalogSequence.objects.next_value()
+            if options['copy']:
+                self.copy_load(rows, seq)
             else:
-                raise CommandError(ERR_FILE_NOT_EXISTS)
+                self.bulk_load(rows, seq)
+            count_rows = Ingredient.objects.count() - count_before
+
+        seconds = time.monotonic() - started
+        self.stdout.write(MSG_STATS.format(
+            read=self.count_read,
+            unique=len(rows),
+            seconds=seconds,
+            rate=self.count_read / seconds if seconds else 0,
+        ))
+        if count_rows == 0:
+            self.stdout.write(self.style.NOTICE(MSG_NO_CHANGES))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                MSG_SUCCESSFUL + f' {count_rows} rows added.'
+            )
+            )
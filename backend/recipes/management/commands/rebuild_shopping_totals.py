@@ -0,0 +1,135 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from recipes.models import IngredientAmount, ShoppingCart, ShoppingListItem
+from users.models import User
+
+BATCH_SIZE = 1000
+# Пользователей в одной транзакции: их корзины заблокированы до конца.
+USER_BATCH_SIZE = 100
+
+MSG_NO_DRIFT = 'Shopping list totals are consistent.'
+MSG_DRIFT = ('Drift detected: {missing} missing, {extra} extra, '
+             '{mismatched} mismatched rows.')
+MSG_REBUILT = 'Shopping list totals rebuilt: {count} rows.'
+
+
+class Command(BaseCommand):
+    help = ("This command recomputes per-user shopping list totals "
+            "from shopping carts and reports drift")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='only report drift, do not rebuild.')
+
+    def user_ids(self):
+        user_ids = set(ShoppingCart.objects.filter(
+            user__isnull=False
+        ).values_list('user_id', flat=True).order_by())
+        user_ids.update(ShoppingListItem.objects.values_list(
+            'user_id', flat=True
+        ).order_by())
+        return sorted(user_ids)
+
+    def lock(self, user_ids):
+        """
+        Корзины пользователей не меняются до конца транзакции.
+        Строки пользователей блокируют добавление в корзину:
+        вставка со ссылкой на пользователя ждёт эту блокировку.
+        Удаление ждёт блокировку строк корзины, а правка состава
+        рецепта - блокировку итогов в apply_deltas.
+        """
+        list(User.objects.select_for_update().filter(
+            pk__in=user_ids
+        ).values_list('pk', flat=True))
+        list(ShoppingCart.objects.select_for_update().filter(
+            user_id__in=user_ids
+        ).values_list('pk', flat=True))
+        return {
+            (item.user_id, item.ingredient_id): item
+            for item in ShoppingListItem.objects.select_for_update().filter(
+                user_id__in=user_ids
+            )
+        }
+
+    def expected_totals(self, user_ids):
+        totals = (
+            IngredientAmount.objects.filter(
+                recipe__shopping_cart__user__in=user_ids
+            )
+            .values_list('recipe__shopping_cart__user', 'ingredient')
+            .annotate(total_amount=Sum('amount'))
+            .order_by()
+        )
+        return {
+            (user_id, ingredient_id): total_amount
+            for user_id, ingredient_id, total_amount
+            in totals.iterator(chunk_size=BATCH_SIZE)
+        }
+
+    def find_drift(self, expected, actual):
+        missing = expected.keys() - actual.keys()
+        extra = actual.keys() - expected.keys()
+        mismatched = {
+            key for key in expected.keys() & actual.keys()
+            if expected[key] != actual[key].total_amount
+        }
+        return missing, extra, mismatched
+
+    def fix(self, expected, actual, missing, extra, mismatched):
+        """Правит только расходящиеся строки этих пользователей."""
+        ShoppingListItem.objects.bulk_create(
+            (
+                ShoppingListItem(user_id=user_id,
+                                 ingredient_id=ingredient_id,
+                                 total_amount=expected[user_id, ingredient_id])
+                for user_id, ingredient_id in missing
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        for key in mismatched:
+            actual[key].total_amount = expected[key]
+        ShoppingListItem.objects.bulk_update(
+            [actual[key] for key in mismatched], ('total_amount',),
+            batch_size=BATCH_SIZE,
+        )
+        ShoppingListItem.objects.filter(
+            pk__in=[actual[key].pk for key in extra]
+        ).delete()
+
+    def handle(self, *args, **options):
+        user_ids = self.user_ids()
+        drift = {'missing': 0, 'extra': 0, 'mismatched': 0}
+        count = 0
+        for start in range(0, len(user_ids), USER_BATCH_SIZE):
+            batch = user_ids[start:start + USER_BATCH_SIZE]
+            with transaction.atomic():
+                if options['check']:
+                    actual = {
+                        (item.user_id, item.ingredient_id): item
+                        for item in ShoppingListItem.objects.filter(
+                            user_id__in=batch
+                        )
+                    }
+                else:
+                    actual = self.lock(batch)
+                # Итоги считаются после блокировок и видят всё,
+                # что успели записать ожидавшие их транзакции.
+                expected = self.expected_totals(batch)
+                missing, extra, mismatched = self.find_drift(expected,
+                                                             actual)
+                drift['missing'] += len(missing)
+                drift['extra'] += len(extra)
+                drift['mismatched'] += len(mismatched)
+                count += len(expected)
+                if not options['check']:
+                    self.fix(expected, actual, missing, extra, mismatched)
+        if any(drift.values()):
+            self.stdout.write(self.style.WARNING(MSG_DRIFT.format(**drift)))
+        else:
+            self.stdout.write(self.style.SUCCESS(MSG_NO_DRIFT))
+        if options['check']:
+            return
+        self.stdout.write(self.style.SUCCESS(
+            MSG_REBUILT.format(count=count)
+        ))
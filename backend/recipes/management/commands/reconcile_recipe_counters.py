@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+MSG_CONSISTENT = 'Recipe counters are consistent.'
+MSG_DRIFT = '{count} recipes have wrong counters.'
+MSG_FIXED = '{count} recipes updated.'
+
+
+def count_subquery(model):
+    return Coalesce(Subquery(
+        model.objects.filter(recipe=OuterRef('pk'))
+        .order_by().values('recipe')
+        .annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = ("This command recomputes favorites_count and in_carts_count "
+            "of recipes and fixes drift")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='only report drift, do not fix.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drifted = Recipe.objects.annotate(
+                actual_favorites=count_subquery(Favorite),
+                actual_in_carts=count_subquery(ShoppingCart),
+            ).filter(
+                ~Q(favorites_count=F('actual_favorites'))
+                | ~Q(in_carts_count=F('actual_in_carts'))
+            ).values_list('pk', flat=True)
+            recipe_ids = list(drifted)
+            if not recipe_ids:
+                self.stdout.write(self.style.SUCCESS(MSG_CONSISTENT))
+                return
+            self.stdout.write(self.style.WARNING(
+                MSG_DRIFT.format(count=len(recipe_ids))
+            ))
+            if options['check']:
+                return
+            count = Recipe.objects.filter(pk__in=recipe_ids).update(
+                favorites_count=count_subquery(Favorite),
+                in_carts_count=count_subquery(ShoppingCart),
+            )
+        self.stdout.write(self.style.SUCCESS(MSG_FIXED.format(count=count)))
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.4 on 2026-10-17 06:33
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min, Sum
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """
+    Оставляет по одному ингредиенту на пару (name, measurement_unit).
+    Итоги списков покупок дублей переносятся на оставшийся
+    ингредиент, иначе каскад удалил бы их вместе с дублями.
+    """
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientAmount = apps.get_model('recipes', 'IngredientAmount')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    duplicates = (
+        Ingredient.objects.values('name', 'measurement_unit')
+        .annotate(keep_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    for group in duplicates:
+        extra = Ingredient.objects.filter(
+            name=group['name'],
+            measurement_unit=group['measurement_unit'],
+        ).exclude(id=group['keep_id'])
+        keep_id = group['keep_id']
+        IngredientAmount.objects.filter(ingredient__in=extra).update(
+            ingredient_id=keep_id
+        )
+        items = ShoppingListItem.objects.filter(ingredient__in=extra)
+        totals = dict(
+            items.values_list('user_id')
+            .annotate(total=Sum('total_amount'))
+            .order_by()
+        )
+        items.delete()
+        for user_id, total in totals.items():
+            kept = ShoppingListItem.objects.filter(
+                user_id=user_id, ingredient_id=keep_id
+            ).update(total_amount=F('total_amount') + total)
+            if not kept:
+                ShoppingListItem.objects.create(
+                    user_id=user_id, ingredient_id=keep_id,
+                    total_amount=total,
+                )
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_recipe_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_ingredients,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.4 on 2026-10-17 06:49
+
+import django.core.validators
+from django.db import migrations, models
+import recipes.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(help_text='Загрузите изображение рецепта', storage=recipes.storage.ContentAddressedStorage(), upload_to='recipes/', validators=[django.core.validators.FileExtensionValidator(['jpg', 'jpeg', 'png'])], verbose_name='Изображение рецепта'),
+        ),
+    ]
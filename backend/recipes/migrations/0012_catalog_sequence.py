@@ -0,0 +1,52 @@
+# Generated by Django 4.2.4 on 2026-10-17 06:54
+
+from django.db import migrations, models
+
+
+def start_catalog_sequence(apps, schema_editor):
+    CatalogSequence = apps.get_model('recipes', 'CatalogSequence')
+    CatalogSequence.objects.create(pk=1, value=1)
+    for name in ('Ingredient', 'Tag'):
+        apps.get_model('recipes', name).objects.update(seq=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_image_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CatalogTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=50)),
+                ('object_id', models.BigIntegerField()),
+                ('seq', models.BigIntegerField(db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='seq',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False, verbose_name='Номер изменения'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='seq',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False, verbose_name='Номер изменения'),
+        ),
+        migrations.AddConstraint(
+            model_name='catalogtombstone',
+            constraint=models.UniqueConstraint(fields=('model', 'object_id'), name='unique_catalog_tombstone'),
+        ),
+        migrations.RunPython(start_catalog_sequence,
+                             migrations.RunPython.noop),
+    ]
@@ -1,12 +1,75 @@
 from colorfield.fields import ColorField
+from django.contrib.postgres.search import SearchVectorField
 from django.core import validators
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, FileExtensionValidator
-from django.db import models
-from users.models import User
-from foodgram.settings import MIN_AMOUNT_MODEL, MIN_TIME_MODEL
+from django.db import models, transaction
+from django.db.models import F
+from recipes.storage import ContentAddressedStorage
+from users.models import Subscribe, User
+from foodgram.settings import (FEED_BACKFILL_LIMIT, FEED_FANOUT_BATCH_SIZE,
+                               MIN_AMOUNT_MODEL, MIN_TIME_MODEL)
 
 
-class Ingredient(models.Model):
+class CatalogSequenceManager(models.Manager):
+
+    def next_value(self):
+        """
+        Следующий номер изменения справочника.
+        Строка счётчика заблокирована до конца транзакции,
+        поэтому номера видны клиентам в порядке коммитов.
+        """
+        if not self.filter(pk=1).update(value=F('value') + 1):
+            self.create(pk=1, value=1)
+        return self.values_list('value', flat=True).get(pk=1)
+
+    def current(self):
+        return self.filter(pk=1).values_list('value', flat=True).first() or 0
+
+
+class CatalogSequence(models.Model):
+    """Счётчик изменений ингредиентов и тегов."""
+    value = models.BigIntegerField(default=0)
+
+    objects = CatalogSequenceManager()
+
+
+class CatalogTombstone(models.Model):
+    """Удалённый ингредиент или тег для синхронизации клиентов."""
+    model = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    seq = models.BigIntegerField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model', 'object_id'],
+                                    name='unique_catalog_tombstone')
+        ]
+
+
+class CatalogModel(models.Model):
+    """Справочник, изменения которого получают номер seq."""
+    seq = models.BigIntegerField(
+        default=0,
+        db_index=True,
+        editable=False,
+        verbose_name='Номер изменения',
+    )
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields:
+            # Иначе save(update_fields=...) не запишет новый seq.
+            kwargs['update_fields'] = {*update_fields, 'seq'}
+        with transaction.atomic():
+            self.seq = CatalogSequence.objects.next_value()
+            super().save(*args, **kwargs)
+
+
+class Ingredient(CatalogModel):
     """Модель ингредиенты."""
     name = models.CharField(
         max_length=200,
@@ -21,14 +84,16 @@ class Ingredient(models.Model):
         ordering = ('name',)
         verbose_name = 'Игредиенты'
         verbose_name_plural = 'Игредиенты'
-        models.UniqueConstraint(fields=['user', 'measurement_unit'],
-                                name='unique_ingredient')
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'measurement_unit'],
+                                    name='unique_ingredient')
+        ]
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
 
 
-class Tag(models.Model):
+class Tag(CatalogModel):
     """Модель тега."""
     name = models.CharField(
         max_length=200,
@@ -45,6 +110,14 @@ class Tag(models.Model):
         max_length=200,
         unique=True,
         verbose_name='Уникальный слаг',)
+    bit = models.PositiveSmallIntegerField(
+        unique=True,
+        editable=False,
+        verbose_name='Бит в маске тегов',
+    )
+
+    # Маска хранится в знаковом BigIntegerField.
+    MAX_TAGS = 63
 
     class Meta:
         ordering = ('name',)
@@ -54,6 +127,18 @@ class Tag(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """Новому тегу достаётся наименьший свободный бит маски."""
+        if self.bit is None:
+            used = set(Tag.objects.values_list('bit', flat=True))
+            free = [bit for bit in range(self.MAX_TAGS) if bit not in used]
+            if not free:
+                raise ValidationError(
+                    f'Нельзя создать больше {self.MAX_TAGS} тегов.'
+                )
+            self.bit = free[0]
+        super().save(*args, **kwargs)
+
 
 class Recipe(models.Model):
     """Модель рецепта."""
@@ -69,6 +154,7 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes/',
+        storage=ContentAddressedStorage(),
         verbose_name='Изображение рецепта',
         help_text='Загрузите изображение рецепта',
         validators=[FileExtensionValidator(['jpg', 'jpeg', 'png'])],
@@ -99,15 +185,73 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации рецепта',
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном',
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В списках покупок',
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор',
+    )
+    tags_mask = models.BigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Маска тегов',
+    )
+    similar_stale = models.BooleanField(
+        default=True,
+        editable=False,
+        verbose_name='Похожие рецепты устарели',
+    )
+    image_derivatives = models.JSONField(
+        default=dict,
+        editable=False,
+        verbose_name='Уменьшенные копии изображения',
+    )
+
+    COUNTER_FIELDS = ('favorites_count', 'in_carts_count')
+    DB_MAINTAINED_FIELDS = COUNTER_FIELDS + (
+        'search_vector', 'tags_mask', 'similar_stale', 'image_derivatives',
+    )
+    POPULAR_ORDERING = ('-favorites_count', '-in_carts_count', '-id')
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(fields=('-pub_date', '-id'),
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=('-favorites_count', '-in_carts_count',
+                                 '-id'),
+                         name='recipe_popular_idx'),
+        ]
 
     def __str__(self):
         return f'Автор: {self.author.email} рецепт: {self.name}'
 
+    def save(self, *args, **kwargs):
+        """
+        Счётчики и маска тегов меняются только через F() в сигналах,
+        а поисковый вектор заполняет триггер PostgreSQL,
+        поэтому при обновлении рецепта они не перезаписываются.
+        """
+        if (not self._state.adding and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.DB_MAINTAINED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class IngredientAmount(models.Model):
     recipe = models.ForeignKey(
@@ -138,7 +282,11 @@ class IngredientAmount(models.Model):
 
 
 class Favorite(models.Model):
-    """Модель избранного."""
+    """
+    Модель избранного.
+    favorites_count рецепта ведут сигналы: bulk_create их не шлёт,
+    после него счётчики пересчитывает reconcile_recipe_counters.
+    """
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -166,7 +314,12 @@ class Favorite(models.Model):
 
 
 class ShoppingCart(models.Model):
-    """Модель корзины покупок."""
+    """
+    Модель корзины покупок.
+    in_carts_count рецепта и ShoppingListItem ведут сигналы:
+    bulk_create их не шлёт, после него нужны
+    reconcile_recipe_counters и rebuild_shopping_totals.
+    """
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -192,3 +345,250 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'Рецепт {self.recipe} в списке покупок у {self.user}'
+
+
+class ShoppingListItemManager(models.Manager):
+    """Поддержка итогов списка покупок в актуальном состоянии."""
+
+    def apply_deltas(self, user_ids, deltas):
+        """
+        Прибавляет к итогам пользователей изменения количества
+        ингредиентов. Вызывается в той же транзакции, что и изменение
+        корзины или состава рецепта.
+        """
+        deltas = {
+            ingredient_id: delta
+            for ingredient_id, delta in deltas.items() if delta
+        }
+        user_ids = set(user_ids)
+        if not deltas or not user_ids:
+            return
+        existing = {
+            (item.user_id, item.ingredient_id): item
+            for item in self.select_for_update().filter(
+                user_id__in=user_ids,
+                ingredient_id__in=deltas,
+            )
+        }
+        to_create, to_update, to_delete = [], [], []
+        for user_id in user_ids:
+            for ingredient_id, delta in deltas.items():
+                item = existing.get((user_id, ingredient_id))
+                if item is None:
+                    if delta > 0:
+                        to_create.append(self.model(
+                            user_id=user_id,
+                            ingredient_id=ingredient_id,
+                            total_amount=delta,
+                        ))
+                    continue
+                item.total_amount += delta
+                if item.total_amount > 0:
+                    to_update.append(item)
+                else:
+                    to_delete.append(item.pk)
+        self.bulk_create(to_create)
+        self.bulk_update(to_update, ('total_amount',))
+        self.filter(pk__in=to_delete).delete()
+
+    def recipe_amounts(self, recipe):
+        amounts = {}
+        for ingredient_id, amount in IngredientAmount.objects.filter(
+            recipe=recipe
+        ).values_list('ingredient_id', 'amount'):
+            amounts[ingredient_id] = amounts.get(ingredient_id, 0) + amount
+        return amounts
+
+    def add_recipe(self, user_id, recipe):
+        self.apply_deltas((user_id,), self.recipe_amounts(recipe))
+
+    def remove_recipe(self, user_id, recipe):
+        amounts = self.recipe_amounts(recipe)
+        self.apply_deltas(
+            (user_id,),
+            {key: -amount for key, amount in amounts.items()}
+        )
+
+    def change_recipe(self, recipe, old_amounts, new_amounts):
+        """
+        Переносит изменение состава рецепта на все корзины с ним.
+        recipe - рецепт или его id.
+        """
+        deltas = {
+            ingredient_id: (new_amounts.get(ingredient_id, 0)
+                            - old_amounts.get(ingredient_id, 0))
+            for ingredient_id in old_amounts.keys() | new_amounts.keys()
+        }
+        if not any(deltas.values()):
+            return
+        user_ids = ShoppingCart.objects.filter(
+            recipe=recipe, user__isnull=False
+        ).values_list('user_id', flat=True)
+        self.apply_deltas(user_ids, deltas)
+
+
+class ShoppingListItem(models.Model):
+    """
+    Итоговое количество ингредиента в списке покупок пользователя.
+    Денормализация корзины: обновляется сигналами ShoppingCart
+    и IngredientAmount (recipes/signals.py) в транзакции изменения.
+    bulk_create и bulk_update сигналов не шлют - после них итоги
+    переносятся вызовом change_recipe.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент',
+    )
+    total_amount = models.PositiveIntegerField(
+        verbose_name='Общее количество',
+    )
+
+    objects = ShoppingListItemManager()
+
+    class Meta:
+        ordering = ('id',)
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Список покупок'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'ingredient'],
+                                    name='unique_shopping_list_item')
+        ]
+
+    def __str__(self):
+        return (f'{self.ingredient} - {self.total_amount} '
+                f'в списке покупок у {self.user}')
+
+
+class FeedItemManager(models.Manager):
+    """Лента подписок: рецепты раскладываются подписчикам при записи."""
+
+    def fan_out(self, recipe):
+        """Добавляет рецепт в ленты всех подписчиков автора пачками."""
+        follower_ids = Subscribe.objects.filter(
+            author_id=recipe.author_id
+        ).values_list('user_id', flat=True).order_by()
+        batch = []
+        for user_id in follower_ids.iterator(
+            chunk_size=FEED_FANOUT_BATCH_SIZE
+        ):
+            batch.append(self.model(user_id=user_id,
+                                    recipe_id=recipe.pk,
+                                    author_id=recipe.author_id,
+                                    pub_date=recipe.pub_date))
+            if len(batch) >= FEED_FANOUT_BATCH_SIZE:
+                self.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        self.bulk_create(batch, ignore_conflicts=True)
+
+    def backfill(self, user, author):
+        """Добавляет в ленту последние рецепты нового автора."""
+        recipes = Recipe.objects.filter(author=author).order_by(
+            '-pub_date', '-id'
+        ).values_list('pk', 'pub_date')[:FEED_BACKFILL_LIMIT]
+        self.bulk_create(
+            [
+                self.model(user_id=user.pk, recipe_id=recipe_id,
+                           author_id=author.pk, pub_date=pub_date)
+                for recipe_id, pub_date in recipes
+            ],
+            ignore_conflicts=True,
+        )
+
+    def prune(self, user, author):
+        """Убирает из ленты рецепты автора после отписки."""
+        self.filter(user=user, author=author).delete()
+
+
+class FeedItem(models.Model):
+    """
+    Запись ленты подписок пользователя.
+    Дата публикации и автор копируются из рецепта,
+    чтобы лента читалась по одному индексу.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации рецепта',
+    )
+
+    objects = FeedItemManager()
+
+    class Meta:
+        ordering = ('-pub_date', '-id')
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'recipe'],
+                                    name='unique_feed_item')
+        ]
+        indexes = [
+            models.Index(fields=('user', '-pub_date', '-id'),
+                         name='feed_user_pub_date_idx'),
+            models.Index(fields=('user', 'author'),
+                         name='feed_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'Рецепт {self.recipe} в ленте у {self.user}'
+
+
+class SimilarRecipe(models.Model):
+    """
+    Рецепт, похожий по составу ингредиентов.
+    Заполняется командой build_similar_recipes.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar',
+        verbose_name='Рецепт',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт',
+    )
+    score = models.FloatField(
+        verbose_name='Сходство',
+    )
+
+    class Meta:
+        ordering = ('recipe_id', '-score', '-similar_id')
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(fields=['recipe', 'similar'],
+                                    name='unique_similar_recipe')
+        ]
+        indexes = [
+            models.Index(fields=('recipe', '-score'),
+                         name='similar_recipe_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.similar} похож на {self.recipe}'
@@ -0,0 +1,186 @@
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from itertools import chain
+
+from django.core.cache import cache
+from django.db import transaction
+from foodgram.settings import (PANTRY_INDEX_CHANGES_TTL,
+                               PANTRY_INDEX_MAX_CHANGES)
+from recipes.models import IngredientAmount
+
+VERSION_CACHE_KEY = 'recipes:pantry_index:version'
+CHANGE_CACHE_KEY = 'recipes:pantry_index:change:{version}'
+
+
+def count_overlaps(postings, ingredient_ids):
+    return Counter(chain.from_iterable(
+        postings.get(ingredient_id, ())
+        for ingredient_id in set(ingredient_ids)
+    ))
+
+
+class PantryIndex:
+    """
+    Обратный индекс «ингредиент → отсортированный массив id рецептов»
+    в памяти процесса для подбора рецептов по продуктам пользователя.
+
+    Изменения рецептов записываются в кеш Django как журнал версий:
+    каждый процесс перечитывает из базы только изменённые рецепты,
+    а полную перестройку делает, если журнал потерян или слишком длинный.
+
+    Индекс - пара (postings, recipes), которая подменяется целиком
+    одним присваиванием: match() читает её без блокировки и видит
+    либо старое, либо новое состояние, но не промежуточное.
+    """
+
+    def __init__(self):
+        self._index = ({}, {})
+        self._version = None
+        self._lock = threading.Lock()
+
+    def current_version(self):
+        return cache.get_or_set(VERSION_CACHE_KEY, 0, None)
+
+    def record_change(self, recipe_ids):
+        """Добавляет в журнал рецепты, состав которых изменился."""
+        recipe_ids = list(recipe_ids)
+        while True:
+            try:
+                version = cache.incr(VERSION_CACHE_KEY)
+            except ValueError:
+                version = 1
+                cache.set(VERSION_CACHE_KEY, version, None)
+            # incr файлового кеша не атомарен: если номер уже занят
+            # другим процессом, берём следующий.
+            if cache.add(CHANGE_CACHE_KEY.format(version=version),
+                         recipe_ids, PANTRY_INDEX_CHANGES_TTL):
+                return
+
+    def record_change_on_commit(self, recipe_ids):
+        recipe_ids = list(recipe_ids)
+        transaction.on_commit(lambda: self.record_change(recipe_ids))
+
+    def build(self, rows):
+        """Строит индекс из пар (id рецепта, id ингредиента)."""
+        postings, recipes = {}, {}
+        for recipe_id, ingredient_id in rows:
+            postings.setdefault(ingredient_id, []).append(recipe_id)
+            recipes.setdefault(recipe_id, set()).add(ingredient_id)
+        self._index = (
+            {
+                ingredient_id: array('q', sorted(set(recipe_ids)))
+                for ingredient_id, recipe_ids in postings.items()
+            },
+            {
+                recipe_id: tuple(ingredient_ids)
+                for recipe_id, ingredient_ids in recipes.items()
+            },
+        )
+
+    def load(self, version):
+        self.build(
+            IngredientAmount.objects.values_list('recipe_id', 'ingredient_id')
+            .order_by().iterator(chunk_size=10000)
+        )
+        self._version = version
+
+    def apply_changes(self, recipe_ids):
+        """
+        Перечитывает состав изменённых рецептов одним запросом.
+        Изменения вносятся в копии словарей и затронутых массивов.
+        """
+        ingredients = {recipe_id: set() for recipe_id in recipe_ids}
+        for recipe_id, ingredient_id in IngredientAmount.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id'):
+            ingredients[recipe_id].add(ingredient_id)
+        postings, recipes = (dict(part) for part in self._index)
+        copied = set()
+
+        def editable(ingredient_id):
+            if ingredient_id not in copied:
+                copied.add(ingredient_id)
+                postings[ingredient_id] = array(
+                    'q', postings.get(ingredient_id, ())
+                )
+            return postings[ingredient_id]
+
+        for recipe_id, ingredient_ids in ingredients.items():
+            for ingredient_id in recipes.pop(recipe_id, ()):
+                recipe_list = editable(ingredient_id)
+                position = bisect_left(recipe_list, recipe_id)
+                if (position < len(recipe_list)
+                        and recipe_list[position] == recipe_id):
+                    del recipe_list[position]
+            if ingredient_ids:
+                recipes[recipe_id] = tuple(ingredient_ids)
+                for ingredient_id in ingredient_ids:
+                    insort(editable(ingredient_id), recipe_id)
+        for ingredient_id in copied:
+            if not postings[ingredient_id]:
+                del postings[ingredient_id]
+        self._index = (postings, recipes)
+
+    def catch_up(self, version):
+        """
+        Применяет журнал изменений с текущей версии индекса.
+        Возвращает False, если журнал неполон и нужна перестройка.
+        """
+        if self._version is None or not (
+            0 < version - self._version <= PANTRY_INDEX_MAX_CHANGES
+        ):
+            return False
+        keys = [CHANGE_CACHE_KEY.format(version=number)
+                for number in range(self._version + 1, version + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return False
+        self.apply_changes(set(chain.from_iterable(changes.values())))
+        self._version = version
+        return True
+
+    def ensure_loaded(self):
+        version = self.current_version()
+        if version == self._version:
+            return
+        with self._lock:
+            if version != self._version and not self.catch_up(version):
+                self.load(version)
+
+    def match(self, ingredient_ids, max_missing=None):
+        """
+        Рецепты, в которых есть хотя бы один из ingredient_ids.
+        Возвращает пары (id рецепта, число недостающих ингредиентов):
+        сначала рецепты, которые можно приготовить целиком, затем
+        с одним недостающим ингредиентом и так далее.
+        """
+        self.ensure_loaded()
+        return self.rank(ingredient_ids, max_missing)
+
+    def ingredients(self, recipe_id):
+        return self._index[1].get(recipe_id, ())
+
+    def recipe_ids(self):
+        return list(self._index[1])
+
+    def overlaps(self, ingredient_ids):
+        """Число общих с ingredient_ids ингредиентов для каждого рецепта."""
+        return count_overlaps(self._index[0], ingredient_ids)
+
+    def rank(self, ingredient_ids, max_missing=None):
+        postings, recipes = self._index
+        matched = count_overlaps(postings, ingredient_ids)
+        result = []
+        for recipe_id, count in matched.items():
+            missing = len(recipes.get(recipe_id, ())) - count
+            if missing < 0:
+                continue
+            if max_missing is None or missing <= max_missing:
+                result.append((missing, -count, -recipe_id))
+        result.sort()
+        return [(-recipe_id, missing) for missing, _, recipe_id in result]
+
+
+pantry_index = PantryIndex()
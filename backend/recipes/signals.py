@@ -0,0 +1,250 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from import_export.signals import post_import
+from recipes import feed, thumbnails, versions
+from recipes.models import (CatalogSequence, CatalogTombstone, Favorite,
+                            Ingredient, IngredientAmount, Recipe,
+                            ShoppingCart, ShoppingListItem, Tag)
+from recipes.pantry_index import pantry_index
+from users.models import Subscribe, User
+
+COUNTER_FIELDS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'in_carts_count',
+}
+
+
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=Tag)
+def record_catalog_tombstone(sender, instance, **kwargs):
+    """Клиенты узнают об удалении при следующей синхронизации."""
+    CatalogTombstone.objects.update_or_create(
+        model=sender._meta.model_name,
+        object_id=instance.pk,
+        defaults={'seq': CatalogSequence.objects.next_value()},
+    )
+
+
+def change_counter(sender, instance, delta):
+    field = COUNTER_FIELDS[sender]
+    Recipe.objects.filter(pk=instance.recipe_id).update(
+        **{field: F(field) + delta}
+    )
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def increment_recipe_counter(sender, instance, created, raw=False,
+                             **kwargs):
+    """Фикстура loaddata уже содержит счётчики рецептов."""
+    if created and not raw:
+        change_counter(sender, instance, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def decrement_recipe_counter(sender, instance, **kwargs):
+    change_counter(sender, instance, -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_shopping_totals(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.user_id is not None:
+        with transaction.atomic(savepoint=False):
+            ShoppingListItem.objects.add_recipe(instance.user_id,
+                                                instance.recipe_id)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def remove_shopping_totals(sender, instance, **kwargs):
+    """
+    При каскадном удалении рецепта корзины и состав удаляются
+    в одной транзакции в любом порядке: что удалено позже,
+    уже не находит пары и ничего не вычитает.
+    """
+    if instance.user_id is None:
+        return
+    with transaction.atomic(savepoint=False):
+        ShoppingListItem.objects.remove_recipe(instance.user_id,
+                                               instance.recipe_id)
+
+
+@receiver(pre_save, sender=IngredientAmount)
+def remember_ingredient_amount(sender, instance, raw=False, **kwargs):
+    instance._saved_amount = None
+    if instance.pk is not None and not raw:
+        instance._saved_amount = IngredientAmount.objects.filter(
+            pk=instance.pk
+        ).values_list('recipe_id', 'ingredient_id', 'amount').first()
+
+
+@receiver(post_save, sender=IngredientAmount)
+def change_shopping_totals(sender, instance, raw=False, **kwargs):
+    """Правки состава в админке и из кода переносятся в корзины."""
+    if raw:
+        return
+    old = getattr(instance, '_saved_amount', None)
+    old_amounts = {}
+    with transaction.atomic(savepoint=False):
+        if old is not None:
+            recipe_id, ingredient_id, amount = old
+            if recipe_id == instance.recipe_id:
+                old_amounts = {ingredient_id: amount}
+            else:
+                ShoppingListItem.objects.change_recipe(
+                    recipe_id, {ingredient_id: amount}, {}
+                )
+        ShoppingListItem.objects.change_recipe(
+            instance.recipe_id,
+            old_amounts,
+            {instance.ingredient_id: instance.amount},
+        )
+
+
+@receiver(post_delete, sender=IngredientAmount)
+def subtract_shopping_totals(sender, instance, **kwargs):
+    with transaction.atomic(savepoint=False):
+        ShoppingListItem.objects.change_recipe(
+            instance.recipe_id, {instance.ingredient_id: instance.amount}, {}
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, **kwargs):
+    if created:
+        feed.schedule(instance)
+
+
+def change_tags_mask(recipes, mask, action):
+    if action == 'post_add':
+        recipes.update(tags_mask=F('tags_mask').bitor(mask))
+    else:
+        recipes.update(tags_mask=F('tags_mask').bitand(~mask))
+
+
+def recipes_with_tag(tag):
+    return Recipe.objects.alias(
+        has_tag=F('tags_mask').bitand(1 << tag.bit)
+    ).filter(has_tag__gt=0)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def update_tags_mask(sender, instance, action, reverse, pk_set, **kwargs):
+    """Маска тегов рецепта повторяет связи рецепта с тегами."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        recipes = Recipe.objects.filter(pk=instance.pk)
+        if action == 'post_clear':
+            recipes.update(tags_mask=0)
+            return
+        mask = 0
+        for bit in Tag.objects.filter(pk__in=pk_set).values_list(
+            'bit', flat=True
+        ):
+            mask |= 1 << bit
+        change_tags_mask(recipes, mask, action)
+    elif action == 'post_clear':
+        change_tags_mask(recipes_with_tag(instance), 1 << instance.bit,
+                         action)
+    else:
+        change_tags_mask(Recipe.objects.filter(pk__in=pk_set),
+                         1 << instance.bit, action)
+
+
+@receiver(pre_delete, sender=Tag)
+def clear_deleted_tag_bit(sender, instance, **kwargs):
+    change_tags_mask(recipes_with_tag(instance), 1 << instance.bit,
+                     'post_remove')
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def record_pantry_change(sender, instance, **kwargs):
+    pantry_index.record_change_on_commit((instance.pk,))
+
+
+@receiver(post_save, sender=IngredientAmount)
+@receiver(post_delete, sender=IngredientAmount)
+def record_pantry_change_ingredients(sender, instance, **kwargs):
+    pantry_index.record_change_on_commit((instance.recipe_id,))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=IngredientAmount)
+@receiver(post_delete, sender=IngredientAmount)
+def mark_similar_stale(sender, instance, **kwargs):
+    """
+    Состав рецепта мог измениться: похожие рецепты пересчитает
+    build_similar_recipes --incremental.
+    """
+    recipe_id = instance.pk if sender is Recipe else instance.recipe_id
+    Recipe.objects.filter(pk=recipe_id, similar_stale=False).update(
+        similar_stale=True
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def build_image_derivatives(sender, instance, **kwargs):
+    thumbnails.schedule(instance)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=IngredientAmount)
+@receiver(post_delete, sender=IngredientAmount)
+def bump_recipes_version(sender, **kwargs):
+    versions.bump_on_commit(versions.RECIPES)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipes_version_tags(sender, action, **kwargs):
+    if action.startswith('post_'):
+        versions.bump_on_commit(versions.RECIPES)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_recipes_version_tag(sender, **kwargs):
+    versions.bump_on_commit(versions.RECIPES)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def bump_recipes_version_ingredient(sender, created=False, **kwargs):
+    """Новый ингредиент ещё не входит ни в один рецепт."""
+    if not created:
+        versions.bump_on_commit(versions.RECIPES)
+
+
+@receiver(post_import)
+def bump_recipes_version_after_import(model, **kwargs):
+    if model is Ingredient:
+        versions.bump_on_commit(versions.RECIPES)
+
+
+@receiver(post_save, sender=User)
+def bump_recipes_version_author(sender, instance, created, update_fields,
+                                **kwargs):
+    if created or update_fields == frozenset(('last_login',)):
+        return
+    versions.bump_on_commit(versions.RECIPES)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def bump_user_version_recipes(sender, instance, **kwargs):
+    """Флаги пользователя и порядок по популярности."""
+    versions.bump_on_commit(versions.user_version(instance.user_id),
+                            versions.POPULARITY)
+
+
+@receiver(post_save, sender=Subscribe)
+@receiver(post_delete, sender=Subscribe)
+def bump_user_version_subscriptions(sender, instance, **kwargs):
+    versions.bump_on_commit(versions.user_version(instance.user_id))
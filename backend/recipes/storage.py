@@ -0,0 +1,54 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+class BlobExists(Exception):
+    """Файл с таким содержимым уже сохранён."""
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, в котором имя файла - хеш его содержимого:
+    recipes/ab/cd/abcd....png. Одинаковые файлы сохраняются один раз,
+    а файл по имени никогда не меняется, поэтому его можно кешировать
+    навсегда. Неиспользуемые файлы удаляет команда gc_media.
+    """
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, digest[:2], digest[2:4],
+                            digest + extension)
+
+    def get_available_name(self, name, max_length=None):
+        """Имя определяется содержимым и не меняется."""
+        if self.exists(name):
+            raise BlobExists(name)
+        return name
+
+    def save(self, name, content, max_length=None):
+        name = self.content_name(name, content)
+        try:
+            return super().save(name, content, max_length)
+        except BlobExists:
+            pass
+        # Повторная загрузка освежает файл, иначе gc_media --min-age
+        # может удалить его до того, как рецепт сошлётся на имя.
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            # gc_media удалил файл между проверкой и utime.
+            return super().save(name, content, max_length)
+        return name
@@ -0,0 +1,50 @@
+import threading
+
+from recipes.models import CatalogSequence, Tag
+
+
+class TagBits:
+    """
+    Соответствие слагов тегов битам маски в памяти процесса.
+    Теги меняются редко, поэтому таблица перечитывается только
+    после смены номера изменения справочника в базе (CatalogSequence).
+    """
+
+    def __init__(self):
+        self._bits = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    def current_version(self):
+        return CatalogSequence.objects.current()
+
+    def ensure_loaded(self):
+        version = self.current_version()
+        if version == self._version:
+            return
+        with self._lock:
+            if version != self._version:
+                self._bits = dict(Tag.objects.values_list('slug', 'bit'))
+                self._version = version
+
+    def choices(self):
+        self.ensure_loaded()
+        return [(slug, slug) for slug in sorted(self._bits)]
+
+    def mask(self, slugs):
+        """
+        Маска, в которой выставлены биты всех переданных тегов.
+        Слаги уже проверены по choices() этого запроса,
+        поэтому номер справочника второй раз не читается.
+        """
+        if self._version is None:
+            self.ensure_loaded()
+        bits = self._bits
+        mask = 0
+        for slug in slugs:
+            if slug in bits:
+                mask |= 1 << bits[slug]
+        return mask
+
+
+tag_bits = TagBits()
@@ -0,0 +1,78 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections, transaction
+from django.conf import settings
+from foodgram.settings import RECIPE_IMAGE_FORMATS, RECIPE_IMAGE_SIZES
+from recipes import versions
+from recipes.models import Recipe
+from sorl.thumbnail import get_thumbnail
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(max_workers=1,
+                              thread_name_prefix='recipe-thumbnails')
+
+
+def get_derivative(image, size, extension):
+    """
+    Копия изображения шириной не больше size в формате extension.
+    sorl-thumbnail создаёт её при первом обращении и дальше
+    берёт из своего хранилища ключей.
+    """
+    return get_thumbnail(image, str(size),
+                         format=RECIPE_IMAGE_FORMATS[extension],
+                         upscale=False)
+
+
+def is_ready(recipe):
+    """Копии построены для текущего изображения рецепта."""
+    return bool(recipe.image) and (
+        recipe.image_derivatives.get('source') == recipe.image.name
+    )
+
+
+def build_derivatives(recipe):
+    """Строит все копии и сохраняет их имена в рецепте."""
+    derivatives = {'source': recipe.image.name}
+    for size in RECIPE_IMAGE_SIZES:
+        derivatives[str(size)] = {
+            extension: get_derivative(recipe.image, size, extension).name
+            for extension in RECIPE_IMAGE_FORMATS
+        }
+    if Recipe.objects.filter(pk=recipe.pk, image=recipe.image.name).update(
+        image_derivatives=derivatives
+    ):
+        versions.bump_on_commit(versions.RECIPES)
+    recipe.image_derivatives = derivatives
+
+
+def build_in_background(recipe_id):
+    close_old_connections()
+    try:
+        recipe = Recipe.objects.only(
+            'id', 'image', 'image_derivatives'
+        ).filter(pk=recipe_id).first()
+        if recipe is not None and recipe.image and not is_ready(recipe):
+            build_derivatives(recipe)
+    except Exception:
+        logger.exception('Не удалось построить копии изображения '
+                         'рецепта %s', recipe_id)
+    finally:
+        close_old_connections()
+
+
+def schedule(recipe):
+    """
+    Ставит построение копий в фоновый поток после коммита.
+    С RECIPE_IMAGE_DERIVATIVES_ASYNC = False копии строятся сразу
+    после коммита в том же потоке.
+    """
+    if not recipe.image or is_ready(recipe):
+        return
+    recipe_id = recipe.pk
+    if settings.RECIPE_IMAGE_DERIVATIVES_ASYNC:
+        transaction.on_commit(lambda: executor.submit(build_in_background,
+                                                      recipe_id))
+    else:
+        transaction.on_commit(lambda: build_in_background(recipe_id))
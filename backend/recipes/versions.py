@@ -0,0 +1,47 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'versions:{name}'
+
+RECIPES = 'recipes'
+POPULARITY = 'popularity'
+
+
+def user_version(user_id):
+    """Версия данных, которые видит только этот пользователь."""
+    return f'user:{user_id}'
+
+
+def initial_version():
+    # После очистки кеша счётчик начнётся с большего значения,
+    # чем любое выданное раньше, и старые ETag не совпадут.
+    return time.time_ns()
+
+
+def get_versions(names):
+    """Текущие версии по именам одним запросом к кешу."""
+    keys = {name: VERSION_KEY.format(name=name) for name in names}
+    cached = cache.get_many(keys.values())
+    versions = {}
+    for name, key in keys.items():
+        if key not in cached:
+            cache.add(key, initial_version(), None)
+            cached[key] = cache.get(key, initial_version())
+        versions[name] = cached[key]
+    return versions
+
+
+def bump(*names):
+    for name in names:
+        key = VERSION_KEY.format(name=name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, initial_version(), None)
+
+
+def bump_on_commit(*names):
+    """Версия меняется только после того, как изменения видны всем."""
+    transaction.on_commit(lambda: bump(*names))